@@ -13,9 +13,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-    
-from . import button
-from . import gpio
-from . import led_matrix
-from . import accel
-from . import sound
+'''
+Ready Set STEM API.
+
+The subsystems (`button`, `gpio`, `led_matrix`, `accel` and `sound`) are
+imported the first time they are used, and initialize their hardware the first
+time it is needed.  So importing `rstem` is fast, and has no effect on the
+hardware.  Use `init()` to initialize hardware at a known time instead.
+'''
+import importlib
+
+SUBSYSTEMS = ['button', 'gpio', 'led_matrix', 'accel', 'sound']
+
+def __getattr__(name):
+    # Import subsystems on first use (e.g. rstem.led_matrix)
+    if name in SUBSYSTEMS:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+def __dir__():
+    return sorted(list(globals()) + SUBSYSTEMS)
+
+def init(*subsystems):
+    '''Initialize the hardware of the given subsystems.
+
+    `subsystems` are the names of the subsystems to initialize, from 'gpio',
+    'led_matrix' and 'sound'.  If none are given, all of them are
+    initialized.  For example:
+
+        rstem.init('gpio', 'led_matrix')
+    '''
+    for name in subsystems or ['gpio', 'led_matrix', 'sound']:
+        module = importlib.import_module('.' + name, __name__)
+        module.init()
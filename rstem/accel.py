@@ -22,6 +22,9 @@ tilted and/or moving.
 import os
 import time
 from struct import pack, unpack
+from array import array
+from threading import Thread, Condition, Event
+from collections import namedtuple
 from fcntl import ioctl
 from ctypes import create_string_buffer, sizeof, string_at
 from ctypes import c_int, c_uint16, c_ushort, c_short, c_char, POINTER, Structure
@@ -86,6 +89,26 @@ I2C_BUS = 1
 # Allowed full scale settings: 2, 4, 8 (in 'g')
 FULL_SCALE = 4
 
+# Output data rates (in Hz), and their CTRL_REG1 DR bits
+DATA_RATES = {800: 0, 400: 1, 200: 2, 100: 3, 50: 4, 12.5: 5, 6.25: 6, 1.56: 7}
+CTRL_REG1_ACTIVE = 0x01
+CTRL_REG1_DR_SHIFT = 3
+
+# Oversampling modes (CTRL_REG2 MODS bits)
+MODE_NORMAL = 0
+MODE_LOW_NOISE_LOW_POWER = 1
+MODE_HIGH_RESOLUTION = 2
+MODE_LOW_POWER = 3
+
+# STATUS bits set when new X, Y and Z data is ready
+STATUS_XYZ_READY = 0x0F
+
+AccelSample = namedtuple('AccelSample', ['time', 'x', 'y', 'z'])
+'''A sample of the forces measured by an `Accel`.
+
+`time` is when the sample was read (from `time.monotonic()`), and `x`, `y` and
+`z` are the forces (see `Accel.forces()`).'''
+
 class Accel(object):
     def __init__(self):
         """
@@ -126,6 +149,8 @@ class Accel(object):
         if i + 1 == TRIES:
             raise IOError('MMA8653 Accelerometer is not returning correct ID ({})'.format(id))
 
+        self._sampler = None
+
     def _read(self, register, bytes_to_read=1):
         '''Read bytes from Accelerometer, starting at `register`.
 
@@ -204,16 +229,21 @@ class Accel(object):
         Ready Set STEM is sitting flat and upright on a table, the return value
         should be close to (0.0, 0.0, 1.0).
         '''
+        if self._sampler:
+            return self._sampler.latest()
+
         # Verify data is ready
         TRIES = 5
         for i in range(TRIES):
-            if self._read(STATUS, 1)[0] & 0x0F == 0xF:
+            if self._read(STATUS, 1)[0] & STATUS_XYZ_READY == STATUS_XYZ_READY:
                 break
             time.sleep(0.001)
         if i + 1 == TRIES:
             raise IOError('Accelerometer data is not available')
 
-        data = self._read(OUT_X_MSB, 6)
+        return self._convert(self._read(OUT_X_MSB, 6))
+
+    def _convert(self, data):
         raw_forces = unpack('>hhh', data)
 
         # Convert raw forces (10-bit left aligned 2's complement data in an
@@ -226,7 +256,118 @@ class Accel(object):
 
         return g_forces
 
+    def _configure(self, data_rate, mode):
+        # Registers can only be changed in standby mode
+        os.write(self.fd, pack('bb', CTRL_REG1, 0x00))
+        os.write(self.fd, pack('bb', CTRL_REG2, mode))
+        os.write(self.fd, pack('bb', CTRL_REG1,
+            (DATA_RATES[data_rate] << CTRL_REG1_DR_SHIFT) | CTRL_REG1_ACTIVE))
+
+    def start_sampling(self, data_rate=100, mode=MODE_NORMAL, ring_size=1024):
+        '''Start reading the forces in the background.
+
+        The accelerometer is set to measure at `data_rate` samples per second
+        (one of 800, 400, 200, 100, 50, 12.5, 6.25 or 1.56), and each sample is
+        read by a background thread into a buffer holding the most recent
+        `ring_size` samples.  `forces()` then returns the latest sample
+        immediately, without waiting on the I2C bus, and `read_since()`
+        returns all of the recent samples.
+
+        `mode` is the oversampling mode: `MODE_NORMAL` (the default),
+        `MODE_LOW_NOISE_LOW_POWER`, `MODE_HIGH_RESOLUTION` (the most
+        oversampling, so the least noise), or `MODE_LOW_POWER`.
+        '''
+        if not data_rate in DATA_RATES:
+            raise ValueError('Invalid data rate')
+        if not mode in [MODE_NORMAL, MODE_LOW_NOISE_LOW_POWER, MODE_HIGH_RESOLUTION, MODE_LOW_POWER]:
+            raise ValueError('Invalid oversampling mode')
+        self.stop_sampling()
+        self._configure(data_rate, mode)
+        self._sampler = _Sampler(self, data_rate, ring_size)
+
+    def stop_sampling(self):
+        '''Stop reading the forces in the background.'''
+        if self._sampler:
+            self._sampler.stop()
+            self._sampler = None
+            # Back to the defaults
+            self._configure(800, MODE_NORMAL)
+
+    def read_since(self, since):
+        '''Returns a list of the `AccelSample`s read after time `since`.
+
+        `since` is a time from `time.monotonic()` (for example, the `time` of
+        the last sample previously returned).  The samples are oldest first,
+        and only the most recent `ring_size` samples are kept (see
+        `start_sampling()`, which must be called first).
+        '''
+        if not self._sampler:
+            raise RuntimeError('Sampling has not been started')
+        return self._sampler.read_since(since)
+
     def __del__(self):
         os.close(self.fd)
 
-__all__ = ['Accel']
+class _Sampler(object):
+    # Reads samples from an Accel into a ring buffer, in a background thread.
+    def __init__(self, accel, data_rate, ring_size):
+        self.accel = accel
+        self.period = 1 / data_rate
+        self.size = ring_size
+        self.samples = 0
+        # Each sample is stored as 4 doubles: time, x, y, z
+        self._ring = array('d', bytes(8 * 4 * ring_size))
+        self._condition = Condition()
+        self._stop = Event()
+        self._thread = Thread(target=self.__sampler_thread, args=())
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __sampler_thread(self):
+        accel = self.accel
+        next_time = time.monotonic()
+        while not self._stop.wait(max(next_time - time.monotonic(), 0)):
+            try:
+                # STATUS and the X/Y/Z data are read in one transaction
+                data = accel._read(STATUS, OUT_Z_LSB + 1)
+            except IOError:
+                data = None
+            now = time.monotonic()
+            if not data or data[0] & STATUS_XYZ_READY != STATUS_XYZ_READY:
+                # Not ready yet - try again shortly
+                next_time = now + self.period / 8
+                continue
+            x, y, z = accel._convert(data[OUT_X_MSB:])
+            with self._condition:
+                index = (self.samples % self.size) * 4
+                self._ring[index:index + 4] = array('d', (now, x, y, z))
+                self.samples += 1
+                self._condition.notify_all()
+            next_time += self.period
+            if next_time < now:
+                next_time = now + self.period
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def latest(self):
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.samples, timeout=1):
+                raise IOError('Accelerometer data is not available')
+            index = ((self.samples - 1) % self.size) * 4
+            return tuple(self._ring[index + 1:index + 4])
+
+    def read_since(self, since):
+        with self._condition:
+            samples = []
+            for n in range(self.samples - 1, max(self.samples - self.size, 0) - 1, -1):
+                index = (n % self.size) * 4
+                if self._ring[index] <= since:
+                    break
+                samples.append(AccelSample(*self._ring[index:index + 4]))
+        samples.reverse()
+        return samples
+
+__all__ = ['Accel', 'AccelSample', 'MODE_NORMAL', 'MODE_LOW_NOISE_LOW_POWER',
+    'MODE_HIGH_RESOLUTION', 'MODE_LOW_POWER']
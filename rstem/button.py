@@ -17,10 +17,263 @@
 This module provides interfaces to the buttons in the I/O Ready Set STEM Cell.
 """
 
-from threading import Thread, Event
+import select
+import traceback
+from threading import Thread, Condition, Lock
 from queue import Queue, Empty
+from collections import namedtuple, deque
 import time
-from rstem.gpio import Input, PULL_UP
+from rstem.gpio import Input, PULL_UP, EDGE_BOTH
+
+BOUNCE_TIME = 0.030
+EVENT_QUEUE_LENGTH = 256
+
+OVERFLOW_DROP = 'drop'
+OVERFLOW_COALESCE = 'coalesce'
+OVERFLOW_BLOCK = 'block'
+
+ButtonEvent = namedtuple('ButtonEvent', ['button', 'pressed', 'time'])
+"""A press or release of a `rstem.button.Button`.
+
+`pressed` is `True` for a press, or `False` for a release, and `time` is when it
+happened (from `time.monotonic()`)."""
+
+class _InputService(object):
+    """One thread that waits for the edges of all Buttons.
+
+    The edges are put in each Button's queue, and in the shared queue of
+    events read by `rstem.button.next_event`.  Waiters are notified via
+    `condition`.
+    """
+    def __init__(self):
+        self.condition = Condition()
+        self.events = deque(maxlen=EVENT_QUEUE_LENGTH)
+        self._buttons = {}
+        self._lock = Lock()
+        self._epoll = select.epoll()
+        self._thread = Thread(target=self.__service_thread, args=())
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, button):
+        with self._lock:
+            self._buttons[button._edge_fd] = button
+            self._epoll.register(button._edge_fd, button._backend.edge_events)
+
+    def remove(self, button):
+        # Once removed, the service thread will not touch the button again.
+        with self._lock:
+            del self._buttons[button._edge_fd]
+            self._epoll.unregister(button._edge_fd)
+
+    def __service_thread(self):
+        while True:
+            # Wake up for edges, or when a debounce time ends.
+            with self._lock:
+                settle_times = [
+                    b._settle_time for b in self._buttons.values() if b._edge_pending]
+            if settle_times:
+                timeout = max(min(settle_times) - time.monotonic(), 0)
+            else:
+                timeout = -1
+            events = self._epoll.poll(timeout)
+
+            jobs = []
+            with self._lock:
+                for fd, event in events:
+                    button = self._buttons.get(fd)
+                    if button:
+                        jobs += self._dispatch(button, button._edge_event(True))
+                for button in self._buttons.values():
+                    if button._edge_pending:
+                        jobs += self._dispatch(button, button._edge_event(False))
+
+            # Callbacks are submitted without holding the lock, as submitting
+            # can wait (OVERFLOW_BLOCK) for callbacks that create or disable
+            # Buttons.
+            executor = _get_callback_executor()
+            for button, callback, event in jobs:
+                executor.submit(button, callback, event)
+
+    def _dispatch(self, button, edge):
+        # Returns the (button, callback, event) jobs to submit for the edge.
+        jobs = []
+        if edge:
+            event = ButtonEvent(button, not edge.level, edge.time)
+            with self.condition:
+                button.current = edge.level
+                button._button_queue.put(edge.level)
+                self.events.append(event)
+                self.condition.notify_all()
+            for callback, pressed in button._callbacks:
+                if pressed == None or pressed == event.pressed:
+                    jobs.append((button, callback, event))
+        return jobs
+
+_input_service = None
+_input_service_lock = Lock()
+
+def _get_input_service():
+    global _input_service
+    with _input_service_lock:
+        if not _input_service:
+            _input_service = _InputService()
+    return _input_service
+
+CallbackStats = namedtuple('CallbackStats', [
+    'calls', 'dropped', 'coalesced', 'queued', 'max_queued', 'average_latency', 'max_latency'])
+"""Statistics of `rstem.button.Button` callbacks.
+
+`calls` is the number of callbacks run, `dropped` and `coalesced` are the number
+of callbacks not run because the callback queue was full, `queued` is the
+number of callbacks currently waiting to run, and `max_queued` the most that
+have been waiting at once.  `average_latency` and `max_latency` are the time (in
+seconds) from a button press/release until its callback started."""
+
+class _CallbackExecutor(object):
+    """A bounded pool of threads that run Button callbacks."""
+    def __init__(self, workers, queue_length, overflow):
+        self.workers = workers
+        self.queue_length = queue_length
+        self.overflow = overflow
+        self._jobs = deque()
+        self._running = set()
+        self._threads = []
+        self._condition = Condition()
+        self._calls = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._max_queued = 0
+        self._total_latency = 0
+        self._max_latency = 0
+
+    def submit(self, button, callback, event):
+        with self._condition:
+            if len(self._jobs) >= self.queue_length:
+                if self.overflow == OVERFLOW_BLOCK:
+                    self._condition.wait_for(lambda: len(self._jobs) < self.queue_length)
+                elif self.overflow == OVERFLOW_COALESCE:
+                    # Replace the event of the same callback, if it is waiting
+                    for job in self._jobs:
+                        if job[0] is button and job[1] is callback:
+                            job[2] = event
+                            self._coalesced += 1
+                            return
+                    self._dropped += 1
+                    return
+                else:
+                    self._dropped += 1
+                    return
+            self._jobs.append([button, callback, event])
+            self._max_queued = max(self._max_queued, len(self._jobs))
+            if len(self._threads) < self.workers:
+                thread = Thread(target=self.__worker_thread, args=())
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+            self._condition.notify_all()
+
+    def _next_job(self):
+        # The first job that can run now.  Callbacks of a button with
+        # serialize_callbacks set run one at a time, in order.
+        for i, job in enumerate(self._jobs):
+            button = job[0]
+            if not (button.serialize_callbacks and button in self._running):
+                del self._jobs[i]
+                return job
+        return None
+
+    def __worker_thread(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while not job:
+                    self._condition.wait()
+                    job = self._next_job()
+                button, callback, event = job
+                self._running.add(button)
+                latency = time.monotonic() - event.time
+                self._total_latency += latency
+                self._max_latency = max(self._max_latency, latency)
+                self._calls += 1
+                # There is now room in the queue
+                self._condition.notify_all()
+            try:
+                callback(event)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._running.discard(button)
+                    self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            average = self._total_latency / self._calls if self._calls else 0
+            return CallbackStats(self._calls, self._dropped, self._coalesced,
+                len(self._jobs), self._max_queued, average, self._max_latency)
+
+_callback_executor = None
+
+def _get_callback_executor():
+    global _callback_executor
+    with _input_service_lock:
+        if not _callback_executor:
+            _callback_executor = _CallbackExecutor(2, 64, OVERFLOW_DROP)
+    return _callback_executor
+
+def configure_callbacks(workers=None, queue_length=None, overflow=None):
+    """Configure how `rstem.button.Button` callbacks are run.
+
+    Callbacks are run by a pool of up to `workers` threads (2 by default),
+    so a slow callback does not delay other buttons, or the program.  Up to
+    `queue_length` callbacks (64 by default) can be waiting to run.  If more
+    presses/releases occur while the queue is full, then `overflow` decides
+    what happens:
+    If `overflow` is `OVERFLOW_DROP` (the default), the new callback is dropped.
+    If `overflow` is `OVERFLOW_COALESCE`, if the same callback of the same
+    button is already waiting, it is run once with the newest press/release.
+    Otherwise the new callback is dropped.
+    If `overflow` is `OVERFLOW_BLOCK`, then the input service waits until
+    there is room in the queue (which delays all button input).
+
+    Arguments that are `None` are left unchanged.  The number of `workers`
+    can only be increased.
+    """
+    if overflow != None and overflow not in [OVERFLOW_DROP, OVERFLOW_COALESCE, OVERFLOW_BLOCK]:
+        raise ValueError('Invalid overflow policy')
+    executor = _get_callback_executor()
+    with executor._condition:
+        if workers != None:
+            executor.workers = max(workers, executor.workers)
+        if queue_length != None:
+            executor.queue_length = queue_length
+        if overflow != None:
+            executor.overflow = overflow
+        executor._condition.notify_all()
+
+def callback_stats():
+    """Returns the `rstem.button.CallbackStats` of all button callbacks."""
+    return _get_callback_executor().stats()
+
+def next_event(timeout=None):
+    """Returns the next press or release of any `rstem.button.Button`.
+
+    Presses and releases of all buttons are queued up in the order they
+    happen, and this function returns the next one as a
+    `rstem.button.ButtonEvent`.  If none are queued, it blocks until one
+    happens.  Only the most recent presses and releases are kept in the
+    queue, so it should be read regularly if used.
+
+    If `timeout=None` (the default), the function will block forever until
+    a press or release occurs.  Otherwise, it will block for up to `timeout`
+    seconds, and return `None` if no press or release occurs.
+    """
+    service = _get_input_service()
+    with service.condition:
+        if not service.condition.wait_for(lambda: service.events, timeout):
+            return None
+        return service.events.popleft()
 
 class Button(Input):
     """A button from a GPIO port.
@@ -67,24 +320,21 @@ class Button(Input):
         """
 
         super().__init__(pin, pull=PULL_UP)
+        self.detect_edges(EDGE_BOTH, debounce=BOUNCE_TIME)
 
         self.current = self._get()
 
         self._button_queue = Queue()
-        self._poll_thread_stop = Event()
-        self._poll_thread = Thread(target=self.__button_poll_thread, args=())
-        self._poll_thread.daemon = True
-        self._poll_thread.start()
-
-    def __button_poll_thread(self):
-        previous = -1
+        self._callbacks = []
+        self.serialize_callbacks = True
+        """If `True` (the default), this button's callbacks run one at a time,
+        in the order of the presses/releases.  Otherwise, they can run at the
+        same time (in different worker threads)."""
 
-        bounce_time = 0.030
-        while not self._poll_thread_stop.wait(bounce_time):
-            self.current = self._get()
-            if previous >= 0 and self.current != previous:
-                self._button_queue.put(self.current)
-            previous = self.current
+        # Edges of all buttons are waited for by one shared thread, that
+        # blocks until the kernel detects an edge.  So idle buttons use no
+        # CPU, and presses are seen as soon as they happen.
+        _get_input_service().add(self)
 
     def _changes(self):
         releases, presses, level = 0, 0, self.current
@@ -119,9 +369,8 @@ class Button(Input):
 
     def disable(self):
         '''Disable the GPIO pin.'''
-        if self._poll_thread:
-            self._poll_thread_stop.set()
-            self._poll_thread.join()
+        _get_input_service().remove(self)
+        self._callbacks = []
         super().disable()
 
     def is_pressed(self, press=True):
@@ -193,23 +442,61 @@ class Button(Input):
         shown with that prefix to allow it to be documented here.
 
         """
-        # Python does not provide a way to wait on multiple Queues.  Big bummer.
-        # To avoid overcomplicating this, we'll simply poll the queues.
+        # Every button press/release is queued with the input service's
+        # condition held, and then notified - so check the queues, and then
+        # wait for a notification of more presses/releases.
+        service = _get_input_service()
         start = time.time()
-        while timeout == None or timeout - (time.time() - start) > 0:
-            for i, button in enumerate(buttons):
-                button_found = button.wait(press=press, timeout=0)
-                if button_found:
-                    return i
-            time.sleep(0.01)
-        return None
+        with service.condition:
+            while True:
+                for i, button in enumerate(buttons):
+                    button_found = button.wait(press=press, timeout=0)
+                    if button_found:
+                        return i
+                if timeout == None:
+                    service.condition.wait()
+                else:
+                    remaining = timeout - (time.time() - start)
+                    if remaining <= 0:
+                        return None
+                    service.condition.wait(remaining)
 
     @staticmethod
     def wait_many(*args, **kwargs):
         return Button.staticmethod_wait_many(*args, **kwargs)
 
-    """ TBD:
-    def callback(self): callback if press, release, or either
-    """
+    def _add_callback(self, callback, pressed):
+        self._callbacks = self._callbacks + [(callback, pressed)]
+        return callback
+
+    def on_press(self, callback):
+        """Call `callback` each time the button is pressed.
+
+        `callback` is called with one argument, the `rstem.button.ButtonEvent`
+        of the press.  Callbacks are run in the background, by a pool of
+        threads (see `rstem.button.configure_callbacks`).
+
+        Returns `callback`, so this function can be used as a decorator.
+        """
+        return self._add_callback(callback, True)
+
+    def on_release(self, callback):
+        """Call `callback` each time the button is released.
+
+        See `rstem.button.Button.on_press`.
+        """
+        return self._add_callback(callback, False)
+
+    def on_change(self, callback):
+        """Call `callback` each time the button is pressed or released.
+
+        See `rstem.button.Button.on_press`.
+        """
+        return self._add_callback(callback, None)
+
+    def remove_callback(self, callback):
+        """Stop calling `callback` for this button."""
+        self._callbacks = [(c, p) for c, p in self._callbacks if c != callback]
 
-__all__ = ['Button']
+__all__ = ['Button', 'ButtonEvent', 'next_event', 'CallbackStats', 'configure_callbacks',
+    'callback_stats', 'OVERFLOW_DROP', 'OVERFLOW_COALESCE', 'OVERFLOW_BLOCK']
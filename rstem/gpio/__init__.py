@@ -21,106 +21,266 @@ Cell, and other Ready Set STEM Cells.
 
 import os
 import time
+import math
+import select
 from functools import partial
-import re
-
-PINS = range(2, 28)
-
-PULLUP_CMD = '/usr/local/bin/pullup.sbin'
-GPIO_EXPORT_FILE = '/sys/class/gpio/export'
-GPIO_UNEXPORT_FILE = '/sys/class/gpio/unexport'
-GPIO_PIN_FORMAT_STRING = '/sys/class/gpio/gpio%d'
-
-PULL_DISABLE = 0
-PULL_DOWN = 1
-PULL_UP = 2
-
-def _global_pin_init():
-    # Disable all GPIOs to start.  Note that unexporting a GPIO if it hasn't
-    # been exported will fail - but we will ignore it.
-    for pin in PINS:
-        try:
-            with open(GPIO_UNEXPORT_FILE, 'w') as f:
-                f.write('%d' % pin)
-        except IOError:
-            pass
-
-def retry_func_on_error(func, tries=10, sleep=0.01, exc=IOError):
-    for i in range(tries):
-        try:
-            ret = func()
-        except exc as err:
-            time.sleep(sleep)
-            sleep *= 2
-        else:
-            break
-    else:
-        raise err
-    return ret
+from threading import Thread, Condition, Lock, Event
+from collections import namedtuple, deque
+from array import array
+from . import gpiomem
+from .backend import Backend, PINS, retry_func_on_error
+from .backend import PULL_DISABLE, PULL_DOWN, PULL_UP
+from .backend import EDGE_NONE, EDGE_RISING, EDGE_FALLING, EDGE_BOTH
+from .sysfs import SysfsBackend, PULLUP_CMD, GPIO_EXPORT_FILE, GPIO_UNEXPORT_FILE, GPIO_PIN_FORMAT_STRING
+from .gpiomem import GpiomemBackend
+from .simulated import SimulatedBackend, Transition
+
+PWM_CHIP_DIR = '/sys/class/pwm/pwmchip0'
+
+# GPIOs that can be driven by the hardware PWM: (PWM channel, GPIO function)
+HARDWARE_PWM_PINS = {
+    12: (0, gpiomem.FUNCTION_ALT0),
+    13: (1, gpiomem.FUNCTION_ALT0),
+    18: (0, gpiomem.FUNCTION_ALT5),
+    19: (1, gpiomem.FUNCTION_ALT5),
+    }
+
+# Environment variable that selects the default backend: 'gpiomem', 'sysfs'
+# or 'simulated'
+GPIO_BACKEND_ENV = 'RSTEM_GPIO_BACKEND'
+
+# A Sequence sleeps until this long before each transition, and then spins
+# until the exact time (letting other threads run each time round).  With only
+# one CPU, spinning would starve the rest of the program, so a Sequence only
+# sleeps.
+SEQUENCE_SPIN_TIME = 0.0005
+
+Edge = namedtuple('Edge', ['time', 'level'])
+'''An edge (change in level) of an `Input`.
+
+`time` is when the edge was detected (from `time.monotonic()`), and `level` is
+the new level of the input (1 for HIGH or 0 for LOW).'''
+
+_init_lock = Lock()
+_backend = None
+
+def init(use_gpiomem=True, backend=None):
+    '''Initialize the GPIOs, by disabling all of them.
+
+    This is done automatically when the first GPIO pin is created, so it is
+    only needed to do the initialization at a known time, or to choose the
+    backend.  Only the first call has any effect.
+
+    `backend` is the `rstem.gpio.backend.Backend` that accesses the pins.
+    By default, if `use_gpiomem=True`, the GPIO registers are memory mapped
+    (from /dev/gpiomem, or /dev/mem), and GPIO levels and pullups are read and
+    written directly via the registers (`GpiomemBackend`).  If the registers
+    can not be mapped, or `use_gpiomem=False`, the slower sysfs interface is
+    used instead (`SysfsBackend`).  To run without a Raspberry Pi, pass a
+    `SimulatedBackend`.  The default can also be chosen by setting the
+    environment variable RSTEM_GPIO_BACKEND to 'gpiomem', 'sysfs' or
+    'simulated'.
+
+    Returns the backend in use.  Raises `RuntimeError` if a different
+    `backend` was already initialized.
+    '''
+    global _backend
+    with _init_lock:
+        if _backend:
+            if backend and backend is not _backend:
+                raise RuntimeError('GPIO already initialized with a different backend')
+            return _backend
+        if not backend:
+            name = os.environ.get(GPIO_BACKEND_ENV, 'gpiomem' if use_gpiomem else 'sysfs')
+            if name == 'simulated':
+                backend = SimulatedBackend()
+            elif name == 'gpiomem':
+                try:
+                    backend = GpiomemBackend()
+                except (OSError, IndexError, ValueError):
+                    backend = SysfsBackend()
+            elif name == 'sysfs':
+                backend = SysfsBackend()
+            else:
+                raise ValueError('Invalid GPIO backend: ' + name)
+        backend.reset()
+        _backend = backend
+        return _backend
 
 class Pin(object):
-    _global_pin_init()
-
     def __init__(self, pin):
-        self._board_rev = self.board_rev()
-        self.gpio_dir = GPIO_PIN_FORMAT_STRING % pin
-        self.pin = pin
-        if pin in PINS:
-            if os.path.exists(self.gpio_dir):
-                raise IOError('GPIO pin already in use')
-
-            with open(GPIO_EXPORT_FILE, 'w') as f:
-                f.write('%d\n' % pin)
-
-            # Repeat trying to configure GPIO as input (default).  Repeats
-            # required because this can fail when run right after the pin
-            # is exported in /sys.  Once it passes, we know the pin is
-            # ready to use.
-            retry_func_on_error(partial(self._set_output, False))
-        else:
+        self._backend = init()
+        if not pin in PINS:
             raise ValueError('Invalid GPIO pin')
-        self._write_gpio_file('direction', 'in')
-        self._write_gpio_file('active_low', '0')
-        self._write_gpio_file('edge', 'none')
+        self.pin = pin
+        self._backend.claim(pin)
         self._set_pull(PULL_DISABLE)
 
     @staticmethod
     def board_rev():
-        with open('/proc/cpuinfo') as f:
-            cpuinfo = f.read()
-        matches = re.findall(
-            '^Revision.*([0-9A-F]{4})$',
-            cpuinfo,
-            flags=(re.MULTILINE|re.IGNORECASE)
-            )
-        board_rev = int(matches[0], 16)
-        return board_rev
-
-    def _write_gpio_file(self, filename, value):
-        def write_val(filename, value):
-            with open(self.gpio_dir + '/' + filename, 'w') as f:
-                f.write(value)
-        retry_func_on_error(partial(write_val, filename, value))
+        return init().board_rev()
 
     def _set_output(self, output, starts_off=True):
+        level = 0
         if output:
             is_low = self._active_low and not starts_off or not self._active_low and starts_off
-            direction = 'low' if is_low else 'high'
-        else:
-            direction = 'in'
-        self._write_gpio_file('direction', direction)
+            level = 0 if is_low else 1
+        self._backend.set_output(self.pin, output, level)
 
     def _set_pull(self, pull):
         if not pull in [PULL_UP, PULL_DOWN, PULL_DISABLE]:
             raise ValueError('Invalid pull type')
-        os.system('%s %d %d %d' % (PULLUP_CMD, self.pin, pull, self._board_rev))
+        self._backend.set_pull(self.pin, pull)
 
     def disable(self):
         '''Disable the GPIO pin.'''
-        with open(GPIO_UNEXPORT_FILE, 'w') as f:
-            f.write('%d\n' % self.pin)
+        self._backend.release(self.pin)
 
 
+def _write_outputs(changes):
+    # Turn each (output, on) in `changes` on or off, all together.
+    set_mask = clear_mask = 0
+    for output, on in changes:
+        if on != output._active_low:
+            set_mask |= 1 << output.pin
+        else:
+            clear_mask |= 1 << output.pin
+    if changes:
+        backend = changes[0][0]._backend
+        backend.set_mask(set_mask)
+        backend.clear_mask(clear_mask)
+
+class _PwmScheduler(object):
+    '''One thread that drives all software PWM outputs.
+
+    Each output's next edge is scheduled from the start of its current
+    period (not from when the last edge happened to be written), so timing
+    errors do not accumulate.  Edges of different outputs that are due at the
+    same time are written together.
+    '''
+    def __init__(self):
+        # output -> [period, on_time, period_start, is_on]
+        self._outputs = {}
+        self._condition = Condition()
+        thread = Thread(target=self.__scheduler_thread, args=())
+        thread.daemon = True
+        thread.start()
+
+    def set(self, output, frequency, duty):
+        with self._condition:
+            period = 1 / frequency
+            entry = self._outputs.get(output)
+            if entry:
+                # Keep the phase, so the change is smooth
+                entry[0], entry[1] = period, duty * period
+            else:
+                # Start the first period now
+                self._outputs[output] = [period, duty * period, time.monotonic(), duty > 0]
+                _write_outputs([(output, duty > 0)])
+            self._condition.notify_all()
+
+    def remove(self, output):
+        with self._condition:
+            self._outputs.pop(output, None)
+            self._condition.notify_all()
+
+    def __scheduler_thread(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                next_time = None
+                changes = []
+                for output, entry in self._outputs.items():
+                    period, on_time, start, is_on = entry
+                    if is_on and on_time < period and now >= start + on_time:
+                        is_on = False
+                        changes.append((output, False))
+                    if now >= start + period:
+                        start += period
+                        if now >= start + period:
+                            # Fell more than a period behind - restart from now
+                            start = now
+                        if not is_on and on_time > 0:
+                            is_on = True
+                            changes.append((output, True))
+                    entry[2], entry[3] = start, is_on
+                    due = start + on_time if is_on and on_time < period else start + period
+                    if next_time == None or due < next_time:
+                        next_time = due
+                _write_outputs(changes)
+                if next_time == None:
+                    self._condition.wait()
+                else:
+                    self._condition.wait(max(next_time - time.monotonic(), 0))
+
+_pwm_scheduler = None
+_pwm_scheduler_lock = Lock()
+
+def _get_pwm_scheduler():
+    global _pwm_scheduler
+    with _pwm_scheduler_lock:
+        if not _pwm_scheduler:
+            _pwm_scheduler = _PwmScheduler()
+    return _pwm_scheduler
+
+class _HardwarePwm(object):
+    '''A hardware PWM channel, driving an `Output` via the sysfs PWM interface.
+
+    Requires the PWM driver to be loaded (for example, "dtoverlay=pwm-2chan"
+    in /boot/config.txt).
+    '''
+    channels_in_use = set()
+
+    def __init__(self, output):
+        self.channel, function = HARDWARE_PWM_PINS[output.pin]
+        if self.channel in self.channels_in_use:
+            raise IOError('PWM channel already in use')
+        # Raises NotImplementedError (before anything is exported) if the
+        # backend can't switch the pin to PWM.
+        output._backend.set_function(output.pin, function)
+        self.pwm_dir = PWM_CHIP_DIR + '/pwm%d' % self.channel
+        exported = False
+        try:
+            if not os.path.exists(self.pwm_dir):
+                with open(PWM_CHIP_DIR + '/export', 'w') as f:
+                    f.write('%d\n' % self.channel)
+                exported = True
+            self.period = 0
+            # The duty cycle must not exceed the period, so start from 0.
+            retry_func_on_error(partial(self._write_pwm_file, 'duty_cycle', 0))
+        except:
+            if exported:
+                try:
+                    with open(PWM_CHIP_DIR + '/unexport', 'w') as f:
+                        f.write('%d\n' % self.channel)
+                except IOError:
+                    pass
+            output._backend.set_output(output.pin, True, int(output._active_low))
+            raise
+        self.channels_in_use.add(self.channel)
+
+    def _write_pwm_file(self, filename, value):
+        with open(self.pwm_dir + '/' + filename, 'w') as f:
+            f.write('%d' % value)
+
+    def set(self, output, frequency, duty):
+        period = int(1e9 / frequency)
+        if output._active_low:
+            duty = 1 - duty
+        if period != self.period:
+            self._write_pwm_file('duty_cycle', 0)
+            self._write_pwm_file('period', period)
+            self.period = period
+        self._write_pwm_file('duty_cycle', int(duty * period))
+        self._write_pwm_file('enable', 1)
+
+    def remove(self, output):
+        self._write_pwm_file('enable', 0)
+        with open(PWM_CHIP_DIR + '/unexport', 'w') as f:
+            f.write('%d\n' % self.channel)
+        self.channels_in_use.discard(self.channel)
+        output._backend.set_output(output.pin, True, int(output._active_low))
+
 class Output(Pin):
     '''A GPIO output.
 
@@ -142,24 +302,59 @@ class Output(Pin):
         super().__init__(pin)
         self._active_low = active_low
         self._set_output(True)
-        self._fvalue = retry_func_on_error(partial(open, self.gpio_dir + '/value', 'w'))
+        self._pwm = None
 
     def _set(self, level):
-        self._fvalue.seek(0)
-        self._fvalue.write('1' if level else '0')
-        self._fvalue.flush()
+        self._backend.set_level(self.pin, level)
 
     def on(self):
         '''Turn the GPIO output on (repects `active_low` setting).'''
+        self._stop_pwm()
         self._set(not self._active_low)
 
     def off(self):
         '''Turn the GPIO output off (repects `active_low` setting).'''
+        self._stop_pwm()
         self._set(self._active_low)
 
+    def pwm(self, frequency=100, duty=0.5, hardware=True):
+        '''Repeatedly turn the output on and off (Pulse Width Modulation).
+
+        The output is turned on for `duty` (0 to 1) of each cycle, at
+        `frequency` cycles per second (Hz).  This can be used to dim an LED
+        (for example, `duty=0.1` is dim, `duty=1` is fully on), or to control
+        the speed of a motor.  The output keeps running in the background
+        until `on()`, `off()` or `pwm()` is called again.  Calling `pwm()`
+        while running changes the frequency and duty smoothly.
+
+        All software PWM outputs are driven by a single background thread.
+        If `hardware=True` (the default), and the pin is one of the GPIOs that
+        the Raspberry Pi's PWM hardware can drive (12, 13, 18 or 19) and the
+        PWM driver is loaded, then the hardware is used instead, which has no
+        timing jitter and uses no CPU.
+        '''
+        if frequency <= 0:
+            raise ValueError('Invalid frequency')
+        if not 0 <= duty <= 1:
+            raise ValueError('Duty must be between 0 and 1')
+        if self._pwm == None:
+            if hardware and self.pin in HARDWARE_PWM_PINS and os.path.exists(PWM_CHIP_DIR):
+                try:
+                    self._pwm = _HardwarePwm(self)
+                except (IOError, OSError, NotImplementedError):
+                    pass
+            if self._pwm == None:
+                self._pwm = _get_pwm_scheduler()
+        self._pwm.set(self, frequency, duty)
+
+    def _stop_pwm(self):
+        if self._pwm:
+            self._pwm.remove(self)
+            self._pwm = None
+
     def disable(self):
         '''Disable the GPIO pin.'''
-        self._fvalue.close()
+        self._stop_pwm()
         super().disable()
 
 class Input(Pin):
@@ -190,28 +385,445 @@ class Input(Pin):
         self._active_low = active_low
         self._set_output(False)
         self._set_pull(pull)
-        self._fvalue = retry_func_on_error(partial(open, self.gpio_dir + '/value', 'r'))
+        self._edge = EDGE_NONE
+        self._edge_fd = None
 
     def configure(self, pull=None):
         '''Set pullup on `pin`.  See `__init__` for info on the `pull` argument.'''
         self._set_pull(pull)
 
+    def detect_edges(self, edge=EDGE_BOTH, debounce=0):
+        '''Detect edges (changes in level) of the input.
+
+        `edge` is which edges to detect:
+        If `edge` is `EDGE_RISING`, then changes from LOW to HIGH are detected.
+        If `edge` is `EDGE_FALLING`, then changes from HIGH to LOW are detected.
+        If `edge` is `EDGE_BOTH`, then all changes are detected.
+        If `edge` is `EDGE_NONE`, then edge detection is disabled.
+
+        Edges are detected by the kernel, so no CPU time is used polling the
+        input while waiting for edges with `wait_edge()`.
+
+        `debounce` is the minimum time in seconds between edges.  Edges that
+        occur within `debounce` seconds of the previous edge are ignored.
+        With `EDGE_BOTH`, the level is checked again once the `debounce` time
+        has passed, so the final level after a bounce is never missed.
+        '''
+        if not edge in [EDGE_NONE, EDGE_RISING, EDGE_FALLING, EDGE_BOTH]:
+            raise ValueError('Invalid edge type')
+        self._backend.set_edge(self.pin, edge)
+        if self._edge_fd is None:
+            # Edges are read from a separate file descriptor, so that they
+            # can be waited for in one thread while the input is read from
+            # another.  The pipe is used to stop waiting (see disable()).
+            self._edge_fd = self._backend.open_edge_fd(self.pin)
+            self._wakeup_fds = os.pipe()
+            self._edge_poll = select.poll()
+            self._edge_poll.register(self._edge_fd, self._backend.edge_events)
+            self._edge_poll.register(self._wakeup_fds[0], select.POLLIN)
+        self._edge = edge
+        self._debounce = debounce
+        self._edge_level = self._read_edge_level()
+        self._edge_pending = False
+        self._settle_time = 0
+
+    def _read_edge_level(self):
+        return self._backend.read_edge_level(self.pin, self._edge_fd)
+
+    def wait_edge(self, timeout=None):
+        '''Wait for an edge of the input, and return it as an `Edge`.
+
+        Edge detection must first be enabled with `detect_edges()`.
+
+        If `timeout=None` (the default), the function will block until an
+        edge occurs.  Otherwise, it will block for up to `timeout` seconds.
+        Returns `None` on timeout, or if the input is disabled while waiting.
+        '''
+        if self._edge == EDGE_NONE:
+            raise RuntimeError('Edge detection is not enabled')
+        deadline = None if timeout == None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            wait = None if deadline == None else max(deadline - now, 0)
+            if self._edge_pending:
+                settle = max(self._settle_time - now, 0)
+                wait = settle if wait == None else min(wait, settle)
+            events = self._edge_poll.poll(None if wait == None else math.ceil(wait * 1000))
+            if any(fd == self._wakeup_fds[0] for fd, event in events):
+                return None
+            edge = self._edge_event(bool(events))
+            if edge:
+                return edge
+            if deadline != None and time.monotonic() >= deadline:
+                return None
+
+    def _edge_event(self, signalled):
+        # Handles an edge signalled by the kernel, or the end of the debounce
+        # time after an ignored edge.  Returns the Edge to report, if any.
+        now = time.monotonic()
+        if signalled:
+            level = self._read_edge_level()
+            if now < self._settle_time:
+                self._edge_pending = True
+                return None
+            # The level may have already changed back, but the kernel only
+            # signals the edges asked for.
+            if self._edge == EDGE_RISING:
+                level = 1
+            elif self._edge == EDGE_FALLING:
+                level = 0
+            elif level == self._edge_level:
+                return None
+        elif self._edge_pending and now >= self._settle_time:
+            self._edge_pending = False
+            level = self._read_edge_level()
+            if self._edge != EDGE_BOTH or level == self._edge_level:
+                return None
+        else:
+            return None
+        self._edge_level = level
+        self._settle_time = now + self._debounce
+        return Edge(now, level)
+
+    def _stop_waiting(self):
+        # Wakes up (and returns None from) any current or future wait_edge()
+        if self._edge_fd is not None:
+            os.write(self._wakeup_fds[1], b'\0')
+
     def _get(self):
-        self._fvalue.seek(0)
-        return 1 if self._fvalue.read().strip() == '1' else 0
+        return self._backend.get_level(self.pin)
 
     def is_on(self):
         '''Return the GPIO input state (repects `active_low` setting).'''
         return bool(not self._get() if self._active_low else self._get())
 
+    def capture(self, rate_hz=1000, duration=None, ring_size=None):
+        '''Start sampling the input level in the background.
+
+        The input is sampled `rate_hz` times per second, evenly spaced, into a
+        preallocated buffer.  If `duration` (in seconds) is given, sampling
+        stops after that long.  Otherwise, sampling continues until stopped,
+        keeping the most recent `ring_size` samples (by default, 1 second of
+        samples).
+
+        Returns a `Capture`, to access the samples.
+        '''
+        if rate_hz <= 0:
+            raise ValueError('Invalid rate')
+        if duration != None:
+            return Capture(self, rate_hz, max(int(math.ceil(duration * rate_hz)), 1), True)
+        return Capture(self, rate_hz, ring_size or int(math.ceil(rate_hz)), False)
+
     def is_off(self):
         '''Return the GPIO input state (repects `active_low` setting).'''
         return not self.is_on()
 
     def disable(self):
         '''Disable the GPIO pin.'''
-        self._fvalue.close()
+        if self._edge_fd is not None:
+            self._stop_waiting()
+            self._backend.close_edge_fd(self.pin, self._edge_fd)
+            for fd in self._wakeup_fds:
+                os.close(fd)
+            self._edge_fd = None
+            self._edge = EDGE_NONE
         super().disable()
 
-__all__ = ['Output', 'Input', PULL_DISABLE, PULL_UP, PULL_DOWN]
+class Capture(object):
+    '''Samples of an `Input`, taken at a fixed rate in the background.
+
+    Returned by `Input.capture()`.  The samples are kept in a ring buffer,
+    and can be accessed (while sampling continues) with `snapshot()` and
+    `iter_edges()`.  `samples` is the total number of samples taken, and
+    `missed` is the number of samples skipped because the sampler fell
+    behind.
+    '''
+    def __init__(self, input, rate_hz, size, stop_when_full):
+        self.input = input
+        self.rate_hz = rate_hz
+        self.size = size
+        self.samples = 0
+        self.missed = 0
+        self._stop_when_full = stop_when_full
+        self._times = array('d', bytes(8 * size))
+        self._levels = array('B', bytes(size))
+        self._lock = Lock()
+        self._stop = Event()
+        self._done = Event()
+        thread = Thread(target=self.__sampler_thread, args=())
+        thread.daemon = True
+        thread.start()
+
+    def __sampler_thread(self):
+        period = 1 / self.rate_hz
+        get = self.input._get
+        try:
+            next_time = time.monotonic()
+            while True:
+                now = time.monotonic()
+                level = get()
+                with self._lock:
+                    index = self.samples % self.size
+                    self._times[index] = now
+                    self._levels[index] = level
+                    self.samples += 1
+                if self._stop_when_full and self.samples >= self.size:
+                    break
+                next_time += period
+                if now - next_time >= period:
+                    # Fell behind - skip the samples that were missed
+                    missed = int((now - next_time) / period)
+                    self.missed += missed
+                    next_time += missed * period
+                if self._stop.wait(max(next_time - time.monotonic(), 0)):
+                    break
+        finally:
+            self._done.set()
+
+    def stop(self):
+        '''Stop sampling.  The samples taken can still be accessed.'''
+        self._stop.set()
+        self._done.wait()
+
+    def wait(self, timeout=None):
+        '''Wait for sampling to finish (when a `duration` was given).
+
+        Returns `True` if finished, or `False` on timeout.
+        '''
+        return self._done.wait(timeout)
+
+    def snapshot(self):
+        '''Return the samples held, oldest first.
+
+        Returns a tuple (times, levels) of `array`s: `times` are the times
+        of each sample (from `time.monotonic()`), and `levels` are the input
+        levels (1 for HIGH or 0 for LOW).
+        '''
+        with self._lock:
+            if self.samples <= self.size:
+                return self._times[:self.samples], self._levels[:self.samples]
+            index = self.samples % self.size
+            return (self._times[index:] + self._times[:index],
+                self._levels[index:] + self._levels[:index])
+
+    def iter_edges(self):
+        '''Iterate over the `Edge`s (changes in level) in the samples held.'''
+        times, levels = self.snapshot()
+        for n in range(1, len(levels)):
+            if levels[n] != levels[n - 1]:
+                yield Edge(times[n], levels[n])
+
+class PinGroup(object):
+    '''A group of GPIO pins, read or written all at once.
+
+    An `rstem.gpio.PinGroup` reads the state of a group of `Input`s (for
+    example, all of the buttons on the GAMER keypad), or turns on/off a group
+    of `Output`s (for example, a bank of LEDs).
+
+    When the GPIO registers are memory mapped (see `init()`), the whole group
+    is read with a single register read, and written with (at most) one
+    register write to set outputs and one to clear outputs, so all pins
+    change together.  With the sysfs backend, the pins are read or written
+    one at a time.
+    '''
+    def __init__(self, pins):
+        '''Create a new `PinGroup` of the given list of `pins`.
+
+        `pins` are `Input`s (including `rstem.button.Button`s) or `Output`s.
+        The order of `pins` is the order of the values returned by `read()`
+        and given to `write()`.  In bit masks, the first pin is bit 0.
+        '''
+        self.pins = list(pins)
+        self._masks = [1 << pin.pin for pin in self.pins]
+        self._group_mask = sum(self._masks)
+        self._active_low_mask = sum(
+            mask for pin, mask in zip(self.pins, self._masks) if pin._active_low)
+        self._backend = init()
+
+    def read_mask(self):
+        '''Return a bit mask of the state of the input pins.
+
+        Bit n of the mask is set if the nth pin of the group is on (respects
+        each pin's `active_low` setting).
+        '''
+        levels = self._backend.levels() ^ self._active_low_mask
+        return sum(1 << n for n, mask in enumerate(self._masks) if levels & mask)
+
+    def read(self):
+        '''Return a tuple of the state of the input pins (`True` if on).'''
+        mask = self.read_mask()
+        return tuple(bool(mask & (1 << n)) for n in range(len(self.pins)))
+
+    def write(self, values):
+        '''Turn each of the output pins on or off.
+
+        `values` is a list of `True` (on) or `False` (off) for each pin, or a
+        bit mask where bit n is set to turn on the nth pin.
+        '''
+        if isinstance(values, int):
+            values = [values & (1 << n) for n in range(len(self.pins))]
+        for pin in self.pins:
+            if isinstance(pin, Output):
+                pin._stop_pwm()
+        on_mask = sum(mask for mask, value in zip(self._masks, values) if value)
+        high_mask = on_mask ^ self._active_low_mask
+        self._backend.set_mask(high_mask)
+        self._backend.clear_mask(self._group_mask & ~high_mask)
+
+    def on(self):
+        '''Turn all of the output pins on.'''
+        self.write([True] * len(self.pins))
+
+    def off(self):
+        '''Turn all of the output pins off.'''
+        self.write([False] * len(self.pins))
+
+class Sequence(object):
+    '''A timed sequence of output changes, played in the background.
+
+    An `rstem.gpio.Sequence` turns `Output`s on and off at precise times (for
+    example, a blink pattern, or the lights of a Simon game), without tying
+    up the program with `time.sleep()` calls.
+
+    On a Raspberry Pi with more than one CPU, each transition is timed to
+    within tens of microseconds.  With one CPU, the sequence does not busy
+    wait (so the rest of the program keeps running smoothly), and transitions
+    may be up to a millisecond or so late.
+    '''
+    def __init__(self, transitions, period=None, repeat=1):
+        '''Create a new `Sequence`.
+
+        `transitions` is a list of (output, on, offset) tuples: `output` (an
+        `Output`) is turned on (if `on` is `True`) or off at `offset` seconds
+        after the sequence starts.  Transitions with the same offset are made
+        at the same time.
+
+        The sequence is played `repeat` times (or forever, if `repeat=None`),
+        each repetition starting `period` seconds after the previous one.  By
+        default, `period` is the offset of the last transition.
+        '''
+        transitions = sorted(transitions, key=lambda transition: transition[2])
+        if transitions and transitions[0][2] < 0:
+            raise ValueError('Transition offsets must not be negative')
+        last_offset = transitions[-1][2] if transitions else 0
+        self.period = last_offset if period == None else period
+        if self.period < last_offset:
+            raise ValueError('Period must not be less than the last offset')
+        if repeat != 1 and self.period <= 0:
+            raise ValueError('Period must be greater than 0 to repeat')
+        self.repeat = repeat
+        self.outputs = list(set(output for output, on, offset in transitions))
+        self._steps = []
+        for output, on, offset in transitions:
+            if self._steps and self._steps[-1][0] == offset:
+                self._steps[-1][1].append((output, on))
+            else:
+                self._steps.append((offset, [(output, on)]))
+
+    @classmethod
+    def pattern(cls, output, pattern, step, repeat=None):
+        '''Create a `Sequence` that turns `output` on and off in a pattern.
+
+        `pattern` is a string of '1' (on) and '0' (off) characters (or a list
+        of `True`/`False`), each lasting `step` seconds.  For example,
+        `Sequence.pattern(led, '1010000', 0.1)` blinks the LED twice, then
+        waits.  By default the pattern repeats forever.
+        '''
+        transitions = []
+        last = None
+        for n, on in enumerate(pattern):
+            on = on not in ['0', False, 0]
+            if on != last:
+                transitions.append((output, on, n * step))
+                last = on
+        return cls(transitions, period=len(pattern) * step, repeat=repeat)
+
+    def play(self, history=1000):
+        '''Start playing the sequence in the background.
+
+        Any PWM (see `Output.pwm`) on the sequence's outputs is stopped.
+        Returns a `SequencePlayback`, to wait for or cancel the playback.
+        '''
+        for output in self.outputs:
+            output._stop_pwm()
+        return SequencePlayback(self, history)
+
+class SequencePlayback(object):
+    '''A playing `Sequence`, returned by `Sequence.play()`.
+
+    `timing_errors` holds how late (in seconds) each of the most recent
+    transitions was made.
+    '''
+    def __init__(self, sequence, history=1000):
+        self.sequence = sequence
+        self.timing_errors = deque(maxlen=history)
+        self._cancel = Event()
+        self._done = Event()
+        self._spin_time = SEQUENCE_SPIN_TIME if (os.cpu_count() or 1) > 1 else 0
+        self._thread = Thread(target=self.__playback_thread, args=())
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _wait_until(self, deadline):
+        # Returns True if cancelled
+        remaining = deadline - time.monotonic() - self._spin_time
+        if remaining > 0 and self._cancel.wait(remaining):
+            return True
+        while time.monotonic() < deadline:
+            # Releases the GIL, so other threads still run
+            time.sleep(0)
+        return self._cancel.is_set()
+
+    def __playback_thread(self):
+        # Run at real-time priority, if allowed
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(1))
+        except (AttributeError, OSError):
+            pass
+        sequence = self.sequence
+        try:
+            start = time.monotonic()
+            n = 0
+            while sequence.repeat == None or n < sequence.repeat:
+                for offset, changes in sequence._steps:
+                    deadline = start + n * sequence.period + offset
+                    if self._wait_until(deadline):
+                        return
+                    now = time.monotonic()
+                    _write_outputs(changes)
+                    self.timing_errors.append(now - deadline)
+                n += 1
+            self._wait_until(start + n * sequence.period)
+        finally:
+            self._done.set()
+
+    def wait(self, timeout=None):
+        '''Wait for the sequence to finish (or be cancelled).
+
+        Returns `True` if finished, or `False` on timeout.
+        '''
+        return self._done.wait(timeout)
+
+    def is_done(self):
+        '''Returns `True` if the sequence has finished (or been cancelled).'''
+        return self._done.is_set()
+
+    def cancel(self):
+        '''Stop playing the sequence.  The outputs are left as they are.'''
+        self._cancel.set()
+        self._done.wait()
+
+    def mean_error(self):
+        '''Returns the average of the recent `timing_errors`.'''
+        if not self.timing_errors:
+            return 0
+        return sum(self.timing_errors) / len(self.timing_errors)
+
+    def max_error(self):
+        '''Returns the largest of the recent `timing_errors`.'''
+        return max(self.timing_errors, default=0)
+
+__all__ = ['Output', 'Input', 'PinGroup', 'Sequence', 'SequencePlayback', 'Capture', 'Edge', 'init',
+    'Backend', 'SysfsBackend', 'GpiomemBackend', 'SimulatedBackend', 'Transition',
+    'PULL_DISABLE', 'PULL_UP', 'PULL_DOWN', 'EDGE_NONE', 'EDGE_RISING', 'EDGE_FALLING', 'EDGE_BOTH']
 
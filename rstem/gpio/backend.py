@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2014, Scott Silver Labs, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+'''
+The interface between the `rstem.gpio` classes and the GPIO hardware.
+'''
+
+import os
+import time
+import select
+
+PINS = range(2, 28)
+
+PULL_DISABLE = 0
+PULL_DOWN = 1
+PULL_UP = 2
+
+EDGE_NONE = 'none'
+EDGE_RISING = 'rising'
+EDGE_FALLING = 'falling'
+EDGE_BOTH = 'both'
+
+def retry_func_on_error(func, tries=10, sleep=0.01, exc=IOError):
+    for i in range(tries):
+        try:
+            ret = func()
+        except exc as err:
+            error = err
+            time.sleep(sleep)
+            sleep *= 2
+        else:
+            break
+    else:
+        raise error
+    return ret
+
+class Backend(object):
+    '''Base class of the GPIO backends.
+
+    A backend does the actual configuring, reading and writing of the GPIO
+    pins for the `rstem.gpio` classes, so that they run unchanged via the
+    sysfs interface (`rstem.gpio.sysfs.SysfsBackend`), the memory mapped
+    registers (`rstem.gpio.gpiomem.GpiomemBackend`), or on a simulated bank
+    of pins (`rstem.gpio.simulated.SimulatedBackend`).  See
+    `rstem.gpio.init()`.
+
+    Pins are given by their GPIO number, and levels are 1 (HIGH) or 0 (LOW).
+    '''
+
+    edge_events = select.POLLPRI | select.POLLERR
+    '''The `select.poll` events that signal an edge on a file descriptor
+    returned by `open_edge_fd()`.'''
+
+    def board_rev(self):
+        '''Return the Raspberry Pi board revision.'''
+        raise NotImplementedError()
+
+    def reset(self):
+        '''Disable all of the pins.'''
+        raise NotImplementedError()
+
+    def claim(self, pin):
+        '''Start using `pin`, configured as an input with no edge detection.
+
+        Raises `IOError` if the pin is already in use.
+        '''
+        raise NotImplementedError()
+
+    def release(self, pin):
+        '''Stop using `pin`.'''
+        raise NotImplementedError()
+
+    def set_output(self, pin, output, level=0):
+        '''Configure `pin` as an output set to `level` (or an input, if not
+        `output`).'''
+        raise NotImplementedError()
+
+    def set_pull(self, pin, pull):
+        '''Set the pullup/down of `pin` (one of the PULL_*).'''
+        raise NotImplementedError()
+
+    def set_function(self, pin, function):
+        '''Set the function of `pin` (one of the `rstem.gpio.gpiomem`
+        FUNCTION_*).'''
+        raise NotImplementedError('GPIO functions are not supported by this backend')
+
+    def get_level(self, pin):
+        '''Return the level of `pin`.'''
+        raise NotImplementedError()
+
+    def set_level(self, pin, level):
+        '''Set the level of output `pin`.'''
+        raise NotImplementedError()
+
+    def levels(self):
+        '''Return the levels of the pins in use, as a bit mask.'''
+        raise NotImplementedError()
+
+    def set_mask(self, mask):
+        '''Set the outputs in bit `mask` high.'''
+        for pin in PINS:
+            if mask & (1 << pin):
+                self.set_level(pin, 1)
+
+    def clear_mask(self, mask):
+        '''Set the outputs in bit `mask` low.'''
+        for pin in PINS:
+            if mask & (1 << pin):
+                self.set_level(pin, 0)
+
+    def set_edge(self, pin, edge):
+        '''Set which edges of `pin` are detected (one of the EDGE_*).'''
+        raise NotImplementedError()
+
+    def open_edge_fd(self, pin):
+        '''Return a new file descriptor that signals `edge_events` when an
+        edge of `pin` is detected.'''
+        raise NotImplementedError()
+
+    def read_edge_level(self, pin, fd):
+        '''Acknowledge the edges signalled on `fd`, and return the level of
+        `pin`.'''
+        raise NotImplementedError()
+
+    def close_edge_fd(self, pin, fd):
+        '''Close a file descriptor returned by `open_edge_fd()`.'''
+        os.close(fd)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2014, Scott Silver Labs, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+'''
+Direct access to the Raspberry Pi (BCM283x and BCM2711) GPIO registers.
+
+The GPIO register block is memory mapped once, so reading and writing GPIO
+levels are memory loads and stores instead of system calls.
+'''
+
+import os
+import mmap
+import time
+from .backend import PULL_DISABLE, PULL_DOWN, PULL_UP
+from .sysfs import SysfsBackend
+
+GPIOMEM_DEVICE = '/dev/gpiomem'
+MEM_DEVICE = '/dev/mem'
+MAP_SIZE = 0x1000
+
+#
+# The processor (SoC) of the Raspberry Pi is given by bits 12-15 of the board
+# revision (0 for the old style revisions of the first Raspberry Pis).
+#
+SOC_BCM2835 = 0
+SOC_BCM2836 = 1
+SOC_BCM2837 = 2
+SOC_BCM2711 = 3
+
+# Physical address of the GPIO registers, for mapping them from /dev/mem
+MAP_ADDRS = {
+    SOC_BCM2835: 0x20200000,
+    SOC_BCM2836: 0x3f200000,
+    SOC_BCM2837: 0x3f200000,
+    SOC_BCM2711: 0xfe200000,
+    }
+
+#
+# Register offsets (in 32-bit words).  Only bank 0 (GPIOs 0-31) is used.
+#
+GPFSEL0 =   0x00//4
+GPSET0 =    0x1C//4
+GPCLR0 =    0x28//4
+GPLEV0 =    0x34//4
+GPPUD =     0x94//4
+GPPUDCLK0 = 0x98//4
+GPIO_PUP_PDN_CNTRL_REG0 = 0xE4//4
+
+# Pullup/down values of the BCM2711 GPIO_PUP_PDN_CNTRL registers (2 bits per
+# pin), which differ from the GPPUD values used by the older SoCs.
+BCM2711_PULLS = {
+    PULL_DISABLE: 0b00,
+    PULL_UP:      0b01,
+    PULL_DOWN:    0b10,
+    }
+
+#
+# GPIO functions (3 bits per pin, in the GPFSEL registers)
+#
+FUNCTION_INPUT =  0b000
+FUNCTION_OUTPUT = 0b001
+FUNCTION_ALT0 =   0b100
+FUNCTION_ALT5 =   0b010
+
+# Time to wait for each step of setting the pullup/down - must be at least 150
+# cycles of the GPIO clock.
+PULL_SETUP_TIME = 0.0001
+
+class GpioRegisters(object):
+    '''The memory mapped GPIO registers.
+
+    Raises `OSError` if the registers cannot be mapped (for example, if not
+    running on a Raspberry Pi, or without permission), or if the Raspberry
+    Pi's processor is not supported.
+    '''
+    def __init__(self, board_rev):
+        self.soc = (board_rev >> 12) & 0xF
+        if self.soc not in MAP_ADDRS:
+            raise OSError(
+                'GPIO registers of processor {} (board revision 0x{:x}) are not supported'.format(
+                self.soc, board_rev))
+        # /dev/gpiomem maps just the GPIO registers, and does not need root.
+        # Otherwise, fall back to mapping them from /dev/mem, like
+        # pullup.sbin.
+        try:
+            fd = os.open(GPIOMEM_DEVICE, os.O_RDWR | os.O_SYNC)
+            offset = 0
+        except OSError:
+            fd = os.open(MEM_DEVICE, os.O_RDWR | os.O_SYNC)
+            offset = MAP_ADDRS[self.soc]
+        try:
+            self._map = mmap.mmap(fd, MAP_SIZE, mmap.MAP_SHARED,
+                mmap.PROT_READ | mmap.PROT_WRITE, offset=offset)
+        finally:
+            os.close(fd)
+        # Registers must be accessed as whole 32-bit words
+        self._regs = memoryview(self._map).cast('I')
+
+    def set_function(self, pin, function):
+        '''Set the function of `pin` (one of the FUNCTION_*).'''
+        reg, shift = GPFSEL0 + pin // 10, (pin % 10) * 3
+        self._regs[reg] = (self._regs[reg] & ~(0b111 << shift)) | (function << shift)
+
+    def set_direction(self, pin, output):
+        '''Configure `pin` as an output (or input, if not `output`).'''
+        self.set_function(pin, FUNCTION_OUTPUT if output else FUNCTION_INPUT)
+
+    def set_level(self, pin, level):
+        '''Set output `pin` high (or low, if not `level`).'''
+        self._regs[GPSET0 if level else GPCLR0] = 1 << pin
+
+    def get_level(self, pin):
+        '''Return the level (0 or 1) of `pin`.'''
+        return (self._regs[GPLEV0] >> pin) & 1
+
+    def levels(self):
+        '''Return the levels of GPIOs 0-31, as a bit mask.'''
+        return self._regs[GPLEV0]
+
+    def set_mask(self, mask):
+        '''Set the outputs in bit `mask` high, all at once.'''
+        if mask:
+            self._regs[GPSET0] = mask
+
+    def clear_mask(self, mask):
+        '''Set the outputs in bit `mask` low, all at once.'''
+        if mask:
+            self._regs[GPCLR0] = mask
+
+    def set_pull(self, pin, pull):
+        '''Set the pullup/down of `pin` (`pull` is one of the gpio PULL_*).'''
+        if self.soc == SOC_BCM2711:
+            # Set directly, via 2 bits per pin
+            reg, shift = GPIO_PUP_PDN_CNTRL_REG0 + pin // 16, (pin % 16) * 2
+            self._regs[reg] = \
+                (self._regs[reg] & ~(0b11 << shift)) | (BCM2711_PULLS[pull] << shift)
+            return
+        self._regs[GPPUD] = pull
+        time.sleep(PULL_SETUP_TIME)
+        self._regs[GPPUDCLK0] = 1 << pin
+        time.sleep(PULL_SETUP_TIME)
+        self._regs[GPPUD] = 0
+        self._regs[GPPUDCLK0] = 0
+
+class GpiomemBackend(SysfsBackend):
+    '''GPIOs via the memory mapped GPIO registers.
+
+    Pins are still exported, configured and watched for edges via sysfs, but
+    levels and pullups are read and written directly via the registers.
+
+    Raises `OSError` if the registers cannot be mapped.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.registers = GpioRegisters(self.board_rev())
+
+    def set_pull(self, pin, pull):
+        self.registers.set_pull(pin, pull)
+
+    def set_function(self, pin, function):
+        self.registers.set_function(pin, function)
+
+    def get_level(self, pin):
+        return self.registers.get_level(pin)
+
+    def set_level(self, pin, level):
+        self.registers.set_level(pin, level)
+
+    def levels(self):
+        return self.registers.levels()
+
+    def set_mask(self, mask):
+        self.registers.set_mask(mask)
+
+    def clear_mask(self, mask):
+        self.registers.clear_mask(mask)
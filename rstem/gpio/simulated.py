@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2014, Scott Silver Labs, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+'''
+A simulated bank of GPIO pins, for running (and testing) GPIO programs
+without a Raspberry Pi.
+'''
+
+import os
+import time
+import heapq
+import select
+from threading import Thread, Condition, RLock
+from collections import namedtuple, deque
+from .backend import Backend, PULL_DISABLE, PULL_UP
+from .backend import EDGE_NONE, EDGE_RISING, EDGE_FALLING
+
+Transition = namedtuple('Transition', ['time', 'pin', 'level'])
+'''A change in level of a simulated output.
+
+`time` is when the change was made (from `time.monotonic()`), `pin` is the
+GPIO, and `level` is the new level (1 for HIGH or 0 for LOW).'''
+
+class SimulatedBackend(Backend):
+    '''An in-memory bank of simulated GPIO pins.
+
+    To use it, initialize `rstem.gpio` with it before creating any pins:
+
+        backend = SimulatedBackend()
+        gpio.init(backend=backend)
+
+    (or set the environment variable RSTEM_GPIO_BACKEND=simulated).
+
+    Inputs are driven with `drive()` or `schedule()`, or are connected to
+    outputs with `connect()`.  An input that is not driven reads as its
+    pullup/down, or (if disabled) keeps its last level.  Each change in level
+    of an output is recorded in `transitions`, which holds the most recent
+    `history` changes.
+    '''
+
+    # Edges are signalled by writing to a pipe
+    edge_events = select.POLLIN
+
+    def __init__(self, board_rev=0xa21041, history=10000):
+        self._board_rev = board_rev
+        self.transitions = deque(maxlen=history)
+        self._condition = Condition(RLock())
+        self._claimed = set()
+        self._outputs = {}
+        self._driven = {}
+        self._pulls = {}
+        self._edges = {}
+        self._edge_fds = {}
+        self._sources = {}
+        self._last_levels = {}
+        self._schedule = []
+        self._schedule_count = 0
+        self._schedule_thread = None
+
+    def board_rev(self):
+        return self._board_rev
+
+    def reset(self):
+        with self._condition:
+            for pin in list(self._claimed):
+                self.release(pin)
+
+    def _level(self, pin):
+        if pin in self._outputs:
+            return self._outputs[pin]
+        for source in self._sources.get(pin, []):
+            if source in self._outputs:
+                return self._outputs[source]
+        if self._driven.get(pin) != None:
+            return self._driven[pin]
+        pull = self._pulls.get(pin, PULL_DISABLE)
+        if pull == PULL_DISABLE:
+            return self._last_levels.get(pin, 0)
+        return 1 if pull == PULL_UP else 0
+
+    def _change(self, pins, change):
+        # Makes `change()`, then signals edges and records transitions for
+        # each of `pins` (or inputs connected to them) whose level changed.
+        with self._condition:
+            pins = pins + [input_pin for input_pin, sources in self._sources.items()
+                if input_pin not in pins and any(source in pins for source in sources)]
+            before = [self._level(pin) for pin in pins]
+            change()
+            now = time.monotonic()
+            for pin, old in zip(pins, before):
+                level = self._level(pin)
+                self._last_levels[pin] = level
+                if level == old:
+                    continue
+                if pin in self._outputs:
+                    self.transitions.append(Transition(now, pin, level))
+                edge = self._edges.get(pin, EDGE_NONE)
+                if edge == EDGE_NONE or edge == (EDGE_FALLING if level else EDGE_RISING):
+                    continue
+                for write_fd in self._edge_fds.get(pin, {}).values():
+                    try:
+                        os.write(write_fd, b'\0')
+                    except BlockingIOError:
+                        # The pipe is full, so the edge is already signalled
+                        pass
+
+    def claim(self, pin):
+        with self._condition:
+            if pin in self._claimed:
+                raise IOError('GPIO pin already in use')
+            self._claimed.add(pin)
+            self._edges[pin] = EDGE_NONE
+
+    def release(self, pin):
+        with self._condition:
+            self._change([pin], lambda: self._outputs.pop(pin, None))
+            self._claimed.discard(pin)
+            self._edges.pop(pin, None)
+
+    def set_output(self, pin, output, level=0):
+        def change():
+            if output:
+                self._outputs[pin] = level
+            else:
+                self._outputs.pop(pin, None)
+        self._change([pin], change)
+
+    def set_pull(self, pin, pull):
+        self._change([pin], lambda: self._pulls.__setitem__(pin, pull))
+
+    def get_level(self, pin):
+        with self._condition:
+            return self._level(pin)
+
+    def set_level(self, pin, level):
+        self.set_mask(1 << pin) if level else self.clear_mask(1 << pin)
+
+    def levels(self):
+        with self._condition:
+            return sum(self._level(pin) << pin for pin in self._claimed)
+
+    def _write_mask(self, mask, level):
+        with self._condition:
+            pins = [pin for pin in self._outputs if mask & (1 << pin)]
+            self._change(pins, lambda: self._outputs.update((pin, level) for pin in pins))
+
+    def set_mask(self, mask):
+        self._write_mask(mask, 1)
+
+    def clear_mask(self, mask):
+        self._write_mask(mask, 0)
+
+    def set_edge(self, pin, edge):
+        with self._condition:
+            self._edges[pin] = edge
+
+    def open_edge_fd(self, pin):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        with self._condition:
+            self._edge_fds.setdefault(pin, {})[read_fd] = write_fd
+        return read_fd
+
+    def read_edge_level(self, pin, fd):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return self.get_level(pin)
+
+    def close_edge_fd(self, pin, fd):
+        with self._condition:
+            write_fd = self._edge_fds[pin].pop(fd)
+        os.close(fd)
+        os.close(write_fd)
+
+    def drive(self, pin, level):
+        '''Drive input `pin` externally HIGH (`level=1`) or LOW (`level=0`).
+
+        If `level=None`, the pin is no longer driven.
+        '''
+        self._change([pin], lambda: self._driven.__setitem__(pin, level))
+
+    def connect(self, output_pin, input_pin):
+        '''Connect `output_pin` to `input_pin`, so that the input is driven
+        by the output (like a wire between the two pins).'''
+        self._change([input_pin],
+            lambda: self._sources.setdefault(input_pin, []).append(output_pin))
+
+    def schedule(self, pin, changes, start=None):
+        '''Drive `pin` with a schedule of changes, in the background.
+
+        `changes` is a list of (offset, level) tuples: input `pin` is driven
+        to `level` (as in `drive()`) at `offset` seconds after `start` (from
+        `time.monotonic()`, by default now).
+        '''
+        if start == None:
+            start = time.monotonic()
+        with self._condition:
+            for offset, level in changes:
+                heapq.heappush(self._schedule, (start + offset, self._schedule_count, pin, level))
+                self._schedule_count += 1
+            if not self._schedule_thread:
+                self._schedule_thread = Thread(target=self.__schedule_thread, args=())
+                self._schedule_thread.daemon = True
+                self._schedule_thread.start()
+            self._condition.notify_all()
+
+    def wait_schedule(self, timeout=None):
+        '''Wait until all scheduled changes have been made.
+
+        Returns `True` if done, or `False` on timeout.
+        '''
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._schedule, timeout)
+
+    def __schedule_thread(self):
+        with self._condition:
+            while True:
+                if not self._schedule:
+                    self._condition.wait()
+                    continue
+                change_time, count, pin, level = self._schedule[0]
+                delay = change_time - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._schedule)
+                self.drive(pin, level)
+                if not self._schedule:
+                    self._condition.notify_all()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2014, Scott Silver Labs, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+'''
+GPIO access via the Linux sysfs interface (/sys/class/gpio).
+'''
+
+import os
+import re
+from functools import partial
+from .backend import Backend, PINS, retry_func_on_error
+
+PULLUP_CMD = '/usr/local/bin/pullup.sbin'
+GPIO_EXPORT_FILE = '/sys/class/gpio/export'
+GPIO_UNEXPORT_FILE = '/sys/class/gpio/unexport'
+GPIO_PIN_FORMAT_STRING = '/sys/class/gpio/gpio%d'
+CPUINFO_FILE = '/proc/cpuinfo'
+
+class SysfsBackend(Backend):
+    '''GPIOs via the Linux sysfs interface.
+
+    Each access is a system call on the pin's sysfs files, and pullups are
+    set with the `PULLUP_CMD` helper program.
+    '''
+    def __init__(self):
+        self._value_fds = {}
+        self._board_rev = None
+
+    def board_rev(self):
+        if self._board_rev == None:
+            with open(CPUINFO_FILE) as f:
+                cpuinfo = f.read()
+            matches = re.findall(
+                '^Revision.*([0-9A-F]{4})$',
+                cpuinfo,
+                flags=(re.MULTILINE|re.IGNORECASE)
+                )
+            self._board_rev = int(matches[0], 16)
+        return self._board_rev
+
+    def reset(self):
+        # Note that unexporting a GPIO if it hasn't been exported will fail -
+        # but we will ignore it.
+        for pin in PINS:
+            try:
+                with open(GPIO_UNEXPORT_FILE, 'w') as f:
+                    f.write('%d' % pin)
+            except IOError:
+                pass
+
+    def _write_gpio_file(self, pin, filename, value):
+        def write_val(filename, value):
+            with open(GPIO_PIN_FORMAT_STRING % pin + '/' + filename, 'w') as f:
+                f.write(value)
+        retry_func_on_error(partial(write_val, filename, value))
+
+    def claim(self, pin):
+        gpio_dir = GPIO_PIN_FORMAT_STRING % pin
+        if os.path.exists(gpio_dir):
+            raise IOError('GPIO pin already in use')
+
+        with open(GPIO_EXPORT_FILE, 'w') as f:
+            f.write('%d\n' % pin)
+
+        # Writing the pin's files is retried, because this can fail when run
+        # right after the pin is exported in /sys.
+        self._write_gpio_file(pin, 'direction', 'in')
+        self._write_gpio_file(pin, 'active_low', '0')
+        self._write_gpio_file(pin, 'edge', 'none')
+        self._value_fds[pin] = retry_func_on_error(
+            partial(os.open, gpio_dir + '/value', os.O_RDWR))
+
+    def release(self, pin):
+        fd = self._value_fds.pop(pin, None)
+        if fd != None:
+            os.close(fd)
+        with open(GPIO_UNEXPORT_FILE, 'w') as f:
+            f.write('%d\n' % pin)
+
+    def set_output(self, pin, output, level=0):
+        if output:
+            direction = 'high' if level else 'low'
+        else:
+            direction = 'in'
+        self._write_gpio_file(pin, 'direction', direction)
+
+    def set_pull(self, pin, pull):
+        os.system('%s %d %d %d' % (PULLUP_CMD, pin, pull, self.board_rev()))
+
+    def get_level(self, pin):
+        return 1 if os.pread(self._value_fds[pin], 2, 0)[:1] == b'1' else 0
+
+    def set_level(self, pin, level):
+        os.pwrite(self._value_fds[pin], b'1' if level else b'0', 0)
+
+    def levels(self):
+        return sum(self.get_level(pin) << pin for pin in self._value_fds)
+
+    def set_edge(self, pin, edge):
+        self._write_gpio_file(pin, 'edge', edge)
+
+    def open_edge_fd(self, pin):
+        return os.open(GPIO_PIN_FORMAT_STRING % pin + '/value', os.O_RDONLY)
+
+    def read_edge_level(self, pin, fd):
+        # Reading the value file also acknowledges the edge to the kernel.
+        return 1 if os.pread(fd, 2, 0)[:1] == b'1' else 0
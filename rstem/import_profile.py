@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2014, Scott Silver Labs, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+'''
+Reports how long it takes to import (and optionally initialize) each rstem
+subsystem.
+
+Usage:
+
+    python3 -m rstem.import_profile [--init] [--min-ms MS] [subsystem ...]
+
+Each subsystem is imported in a new Python process (with `-X importtime`), so
+the times do not depend on what was already imported.  The modules that took
+at least `--min-ms` milliseconds (default 1) to import are listed under each
+subsystem.  With `--init`, the time taken by the subsystem's `init()` is also
+reported - note that this initializes the hardware.
+'''
+
+import re
+import sys
+import argparse
+import subprocess
+from . import SUBSYSTEMS
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+# The subsystem is imported with an import statement, as -X importtime does not
+# report the module itself when imported via importlib.
+INIT_TIMER = '''
+import time, sys
+import {0}
+module = sys.modules[{0!r}]
+if hasattr(module, 'init'):
+    start = time.monotonic()
+    module.init()
+    print(time.monotonic() - start)
+'''
+
+def profile(subsystem, init=False):
+    '''Imports `subsystem` in a new Python process, and returns its profile.
+
+    Returns a tuple (modules, init_time).  `modules` is a list of (module,
+    depth, self_ms, cumulative_ms) for each module imported, in the order
+    reported by `-X importtime`.  `init_time` is the time (in seconds) taken
+    by the subsystem's `init()`, or None if not timed.
+    '''
+    name = __package__ + '.' + subsystem
+    if init:
+        code = INIT_TIMER.format(name)
+    else:
+        code = 'import ' + name
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append((module, len(indent) // 2, int(self_us) / 1000, int(cumulative_us) / 1000))
+    init_time = float(proc.stdout.split()[-1]) if init and proc.stdout.strip() else None
+    return modules, init_time
+
+def report(subsystems=SUBSYSTEMS, init=False, min_ms=1.0, file=sys.stdout):
+    '''Prints an import time report for the given `subsystems`.'''
+    for subsystem in subsystems:
+        name = __package__ + '.' + subsystem
+        try:
+            modules, init_time = profile(subsystem, init)
+        except RuntimeError as err:
+            print('{:<24} FAILED: {}'.format(name, err), file=file)
+            continue
+        tree = _subtree(modules, name)
+        if not tree:
+            print('{:<24} FAILED: not imported'.format(name), file=file)
+            continue
+        line = '{:<24} import {:8.1f} ms'.format(name, tree[3])
+        if init_time is not None:
+            line += '    init {:8.1f} ms'.format(init_time * 1000)
+        print(line, file=file)
+        stack = [(child, 1) for child in reversed(tree[4])]
+        while stack:
+            (module, depth, own, cumulative, children), indent = stack.pop()
+            if cumulative >= min_ms:
+                print('    {:<40} {:8.1f} ms (self {:.1f} ms)'.format(
+                    '  ' * indent + module, cumulative, own), file=file)
+                stack.extend((child, indent + 1) for child in reversed(children))
+
+def _subtree(modules, name):
+    # -X importtime lists each module after the modules it imports.  Build
+    # the tree of (module, depth, self_ms, cumulative_ms, children) nodes, and
+    # return the node for module `name`.
+    pending = {}
+    found = None
+    for module, depth, own, cumulative in modules:
+        node = (module, depth, own, cumulative, pending.pop(depth + 1, []))
+        pending.setdefault(depth, []).append(node)
+        if module == name:
+            found = node
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report import times of rstem subsystems.')
+    parser.add_argument('subsystems', nargs='*', default=SUBSYSTEMS,
+        help='subsystems to profile (default: all)')
+    parser.add_argument('--init', action='store_true',
+        help='also time each subsystem init() (initializes the hardware)')
+    parser.add_argument('--min-ms', type=float, default=1.0,
+        help='only list modules that took at least this long to import')
+    args = parser.parse_args(argv)
+    report(args.subsystems, init=args.init, min_ms=args.min_ms)
+
+if __name__ == '__main__':
+    main()
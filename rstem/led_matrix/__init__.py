@@ -22,14 +22,20 @@ This module provides interfaces to the LED Matrix Ready Set STEM Cell.
 import os
 import re
 import time
+import math
 from . import led_driver     # c extension that controls led matrices and contains framebuffer
 from .. import gpio
 import copy
 import subprocess
 from itertools import islice
+from array import array
+from threading import Thread, Condition, Lock
+from collections import namedtuple, deque, OrderedDict
 
 MAX_MATRICES = 64
 MATRIX_SPI_SHIFT_REGISTER_LENGTH=32
+TRANSFORM_CACHE_SIZE = 256  #: Max number of transformed Sprite bitmaps cached
+TEXT_CACHE_SIZE = 64        #: Max number of rendered Text strings cached
 width = 0    #: The width of the LED matrix grid
 height = 0   #: The height of the LED matrix grid
 
@@ -57,11 +63,106 @@ def _color_array_to_str(array, height, width):
         s += '\n'
     return s
 
+def _compile_bitmap(bitmap):
+    '''Compiles a bitmap into a form that can be quickly drawn.
+
+    Returns a list with one (colors, runs) tuple for each column of the
+    bitmap.  `colors` is the column as bytes (transparent pixels are 0), and
+    `runs` is a list of (start, stop) ranges of the opaque pixels in the column.
+    '''
+    compiled = []
+    for column in bitmap:
+        runs = []
+        start = None
+        for y, color in enumerate(column):
+            if color >= 0:
+                if start is None:
+                    start = y
+            elif start is not None:
+                runs.append((start, y))
+                start = None
+        if start is not None:
+            runs.append((start, len(column)))
+        compiled.append((bytes(max(color, 0) for color in column), runs))
+    return compiled
+
 def _quarter_clockwise_rotations(angle):
     if angle % 90 != 0:
         raise ValueError('angle must be a multiple of 90.')
     return int(angle/90) % 4
 
+#
+# Sprite transforms
+#
+# Any combination of Sprite rotations and flips is one of 8 transforms, each a
+# (transposed, xflip, yflip) tuple.  The transformed bitmap is built from the
+# untransformed bitmap by first transposing it (if transposed), and then
+# reversing the order of columns (if xflip) and pixels in each column (if
+# yflip).  Combined with a crop box on the untransformed bitmap, this
+# describes any chain of crop()/rotate()/flip() calls, and so makes a good key
+# for caching transformed bitmaps.
+#
+_IDENTITY = (False, False, False)
+_ROTATIONS = [
+    _IDENTITY,
+    (True, False, True),
+    (False, True, True),
+    (True, True, False),
+    ]
+_FLIP = (False, True, False)
+_VERTICAL_FLIP = (False, False, True)
+
+def _compose_transforms(first, second):
+    '''Returns the transform equal to `first` followed by `second`.'''
+    transposed1, xflip1, yflip1 = first
+    transposed2, xflip2, yflip2 = second
+    if transposed1:
+        xflip2, yflip2 = yflip2, xflip2
+    return (transposed1 != transposed2, xflip1 != xflip2, yflip1 != yflip2)
+
+def _transformed_bitmap(bitmap, box, transform):
+    '''Returns a new bitmap, cropped to `box` and then transformed.'''
+    x, y, width, height = box
+    transposed, xflip, yflip = transform
+    columns = [bitmap[column][y:y + height] for column in range(x, x + width)]
+    if transposed:
+        columns = [list(row) for row in zip(*columns)]
+        xflip, yflip = yflip, xflip
+    if xflip:
+        columns.reverse()
+    if yflip:
+        columns = [column[::-1] for column in columns]
+    return columns
+
+def _bitmap_key(bitmap):
+    '''Returns a hashable key of the contents of `bitmap`.
+
+    The key is built from bytes, which cache their hash, so looking the key
+    up again does not go through every pixel.
+    '''
+    return (len(bitmap), array('h', (color for column in bitmap for color in column)).tobytes())
+
+_transform_cache = OrderedDict()
+_transform_cache_lock = Lock()
+
+def _cached_transformed_bitmap(key, bitmap, box, transform):
+    # LRU cache of transformed bitmaps, shared by all Sprites.  Sprites with
+    # the same untransformed bitmap have the same key.  The cached bitmaps
+    # are shared, so must never be edited - Sprites get a copy.
+    with _transform_cache_lock:
+        transformed = _transform_cache.get(key)
+        if transformed is not None:
+            _transform_cache.move_to_end(key)
+            return transformed
+
+    transformed = _transformed_bitmap(bitmap, box, transform)
+
+    with _transform_cache_lock:
+        _transform_cache[key] = transformed
+        while len(_transform_cache) > TRANSFORM_CACHE_SIZE:
+            _transform_cache.popitem(last=False)
+    return transformed
+
 class Sprite(object):
     '''A Sprite (2-dimensional bitmapped image) object.
 
@@ -106,8 +207,13 @@ class Sprite(object):
         reversed_transposed_bitmap = [[_to_color(color) for color in line] for line in lines]
         # Reverse and transpose array
         transposed_bitmap = list(reversed(reversed_transposed_bitmap))
-        self.original_bitmap = [list(z) for z in zip(*transposed_bitmap)]
+        self._init_bitmap([list(z) for z in zip(*transposed_bitmap)])
 
+    def _init_bitmap(self, bitmap):
+        self.original_bitmap = bitmap
+        # (snapshot, key) of the original_bitmap, once needed by _apply()
+        self._original_state = None
+        self._compiled_source = None
         self.reset()
 
     @classmethod
@@ -119,6 +225,15 @@ class Sprite(object):
     def _bitmap(self):
         return self.bitmap
 
+    def _compiled(self):
+        # The compiled bitmap is cached until self.bitmap changes (including
+        # in-place edits of its pixels).  Comparing against a copy of the
+        # bitmap it was compiled from is much cheaper than compiling again.
+        if self.bitmap != self._compiled_source:
+            self._compiled_bitmap = _compile_bitmap(self.bitmap)
+            self._compiled_source = [list(column) for column in self.bitmap]
+        return self._compiled_bitmap
+
     @property
     def width(self):
         '''Returns the width of the sprite.
@@ -135,31 +250,72 @@ class Sprite(object):
         if self.height != sprite.height:
             raise ValueError("Can only add sprites of the same height")
         self.bitmap += sprite.bitmap
+        # Further transforms apply to the concatenated bitmap.
+        self._set_transform_base(self.bitmap)
         return self
 
-    def _recreate_bitmap(self, xrange, yrange):
-        yrange = list(yrange)
-        self.bitmap = [[self.bitmap[x][y] for y in yrange] for x in xrange]
+    def _set_transform_base(self, bitmap):
+        # Transforms are tracked as a crop box and transform of a base bitmap
+        # (normally the original_bitmap) - see _transformed_bitmap().
+        self._base = bitmap
+        self._base_snapshot, self._base_key = None, None
+        if bitmap is self.original_bitmap and self._original_state:
+            self._base_snapshot, self._base_key = self._original_state
+        self._box = (0, 0, len(bitmap), len(bitmap[0]) if bitmap else 0)
+        self._transform = _IDENTITY
+        # The (cached) bitmap that self.bitmap is a copy of
+        self._transformed = None
+
+    def _start_transform(self):
+        # If self.bitmap was replaced or edited since the last transform,
+        # further transforms apply to it as it is now.
+        if self.bitmap is not self._base and self.bitmap != self._transformed:
+            self._set_transform_base(self.bitmap)
+
+    def _apply(self, box, transform):
+        # The base bitmap may have been edited in place, in which case its
+        # snapshot and key are out of date.  (Comparing lists is much cheaper
+        # than building the key.)
+        if self._base_snapshot is None or self._base != self._base_snapshot:
+            self._base_snapshot = [list(column) for column in self._base]
+            self._base_key = _bitmap_key(self._base)
+            if self._base is self.original_bitmap:
+                self._original_state = (self._base_snapshot, self._base_key)
+        self._box, self._transform = box, transform
+        key = (self._base_key, box, transform)
+        self._transformed = _cached_transformed_bitmap(key, self._base_snapshot, box, transform)
+        self.bitmap = [list(column) for column in self._transformed]
 
     def crop(self, origin=(0,0), dimensions=None):
         '''In-place crop of the sprite.
 
         Returns itself, so this function can be chained.
         '''
+        self._start_transform()
         x, y = origin
         if x >= self.width:
             raise IndexError('Origin X is greater than Sprite width')
         if y >= self.height:
             raise IndexError('Origin Y is greater than Sprite height')
+        if x < 0 or y < 0:
+            raise IndexError('Origin must not be negative')
 
         try:
             width, height = dimensions
         except TypeError:
             width, height = self.width, self.height
+        width, height = min(width, self.width - x), min(height, self.height - y)
 
-        xrange = range(x, min(x + width, self.width))
-        yrange = range(y, min(y + height, self.height))
-        self._recreate_bitmap(xrange, yrange)
+        # Convert the crop to a crop box of the untransformed base bitmap
+        box_x, box_y, box_width, box_height = self._box
+        transposed, xflip, yflip = self._transform
+        if transposed:
+            x, y, width, height = y, x, height, width
+        if xflip:
+            x = box_width - x - width
+        if yflip:
+            y = box_height - y - height
+        self._apply((box_x + x, box_y + y, width, height), self._transform)
         return self
 
     def rotate(self, angle=90):
@@ -170,23 +326,9 @@ class Sprite(object):
         Returns itself, so this function can be chained.
         '''
         quarter_clockwise_rotations = _quarter_clockwise_rotations(angle)
-        if quarter_clockwise_rotations == 0:
-            xrange, yrange = range(self.width), range(self.height)
-            transposed = False
-        elif quarter_clockwise_rotations == 1:
-            xrange, yrange = range(self.width), reversed(range(self.height))
-            transposed = True
-        elif quarter_clockwise_rotations == 2:
-            xrange, yrange = reversed(range(self.width)), reversed(range(self.height))
-            transposed = False
-        elif quarter_clockwise_rotations == 3:
-            xrange, yrange = reversed(range(self.width)), range(self.height)
-            transposed = True
-        else:
-            raise RuntimeException('Internal Error: Invalid rotation')
-        self._recreate_bitmap(xrange, yrange)
-        if transposed:
-            self.bitmap = [list(z) for z in zip(*self.bitmap)]
+        self._start_transform()
+        transform = _ROTATIONS[quarter_clockwise_rotations]
+        self._apply(self._box, _compose_transforms(self._transform, transform))
         return self
         
     def flip(self, vertical=False):
@@ -194,11 +336,9 @@ class Sprite(object):
 
         Returns itself, so this function can be chained.
         '''
-        if vertical:
-            xrange, yrange = range(self.width), reversed(range(self.height))
-        else:
-            xrange, yrange = reversed(range(self.width)), range(self.height)
-        self._recreate_bitmap(xrange, yrange)
+        self._start_transform()
+        transform = _VERTICAL_FLIP if vertical else _FLIP
+        self._apply(self._box, _compose_transforms(self._transform, transform))
         return self
 
     def __str__(self):
@@ -214,6 +354,7 @@ class Sprite(object):
         # in-place (even though it is mutable) - it should be replaced by any
         # operations that do work on it (e.g. flip()).
         self.bitmap = self.original_bitmap
+        self._set_transform_base(self.original_bitmap)
         return self
         
 class Text(Sprite):
@@ -232,12 +373,29 @@ class Text(Sprite):
 
         `char_spacing` is the number of blank pixels that are put between two
         characters in a string.
+
+        Each font is only loaded once, and recently created strings are
+        cached, so creating the same `Text` again is fast.
         '''
-        with open(self._font_path(font_dir, font_name, message[0])) as f:
-            super().__init__(f.read())
-        if len(message) > 1:
-            self.__add__(Sprite((('-' * char_spacing) + '\n') * self.height))
-            self.__add__(Text(message[1:], char_spacing=char_spacing, font_name=font_name, font_dir=font_dir))
+        if not message:
+            raise ValueError('Text message must not be empty')
+        font_dir = self._font_dir(font_dir)
+        key = (message, char_spacing, font_name, font_dir)
+        with _text_cache_lock:
+            rendered = _text_cache.get(key)
+            if rendered is not None:
+                _text_cache.move_to_end(key)
+
+        if rendered is None:
+            rendered = _Font.load(font_name, font_dir).render(message, char_spacing)
+            with _text_cache_lock:
+                _text_cache[key] = rendered
+                while len(_text_cache) > TEXT_CACHE_SIZE:
+                    _text_cache.popitem(last=False)
+
+        # The rendered tuple is shared, but each Text needs its own (mutable)
+        # bitmap.
+        self._init_bitmap([list(column) for column in rendered])
 
     @classmethod
     def from_file(cls, filename):
@@ -248,6 +406,20 @@ class Text(Sprite):
         font_dir = cls._font_dir(font_dir)
         return [d for d in os.glob(font_dir) if os.path.isdir(d)]
 
+    @classmethod
+    def pack_font(cls, font_name, font_dir=None):
+        '''Packs a font's sprite files into a single file.
+
+        The font directory `font_name` (in `font_dir`, which defaults to the
+        built-in font directory) is written to the file `font_name` + '.glyphs'
+        in `font_dir`.  When a packed font file exists, it is used instead of
+        the font directory, so the font loads with one file read.
+
+        Returns the name of the packed font file.
+        '''
+        font_dir = cls._font_dir(font_dir)
+        return _Font.from_dir(font_name, font_dir).write_packed(font_dir)
+
     @staticmethod
     def _font_dir(font_dir=None):
         if font_dir is None:
@@ -258,26 +430,478 @@ class Text(Sprite):
             raise IOError('Font path does not exist.')
 
         return font_dir
-        
-    def _font_path(self, font_dir, font_name, char):
-        font_path = os.path.join(self._font_dir(), font_name)
-        unknown_font_path = os.path.join(font_path, 'unknown.spr')
-        
-        if char.isdigit():
-            font_path = os.path.join(font_path, 'numbers', char + '.spr')
-        elif char.isupper():
-            font_path = os.path.join(font_path, 'upper', char + '.spr')
-        elif char.islower():
-            font_path = os.path.join(font_path, 'lower', char + '.spr')
-        elif char.isspace():
-            font_path = os.path.join(font_path, 'space.spr')
-        else:
-            font_path = os.path.join(font_path, 'misc', str(ord(char)) + '.spr')
-            
-        if not os.path.isfile(font_path):
-            return unknown_font_path
 
-        return font_path
+class _Font(object):
+    '''A glyph atlas: all of the character bitmaps of one font.
+
+    A font is either a directory of sprite files (one per character), or a
+    packed font file (see `Text.pack_font()`).
+    '''
+    # Packed font files have a header line for each glyph (PACKED_GLYPH +
+    # ordinal of the character, or PACKED_GLYPH + 'unknown'), followed by the
+    # lines of the glyph's sprite.
+    PACKED_SUFFIX = '.glyphs'
+    PACKED_GLYPH = ':'
+    UNKNOWN = 'unknown'
+
+    _fonts = {}
+    _fonts_lock = Lock()
+
+    def __init__(self, name, glyphs):
+        self.name = name
+        self.glyphs = glyphs
+        try:
+            self.unknown = glyphs[self.UNKNOWN]
+        except KeyError:
+            raise IOError('Font {} has no unknown character sprite.'.format(name))
+        self.height = len(self.unknown[0])
+        self._compiled_glyphs = {}
+
+    @classmethod
+    def load(cls, font_name, font_dir):
+        '''Returns the font, loading it only the first time.'''
+        key = (font_name, font_dir)
+        with cls._fonts_lock:
+            font = cls._fonts.get(key)
+            if font is None:
+                packed = os.path.join(font_dir, font_name + cls.PACKED_SUFFIX)
+                if os.path.isfile(packed):
+                    font = cls.from_packed(font_name, packed)
+                else:
+                    font = cls.from_dir(font_name, font_dir)
+                cls._fonts[key] = font
+        return font
+
+    @classmethod
+    def from_dir(cls, font_name, font_dir):
+        font_path = os.path.join(font_dir, font_name)
+        if not os.path.isdir(font_path):
+            raise IOError('Font {} does not exist.'.format(font_name))
+        glyphs = {}
+        def load(char, *path):
+            filename = os.path.join(font_path, *path)
+            if os.path.isfile(filename):
+                glyphs[char] = Sprite.from_file(filename).original_bitmap
+        for subdir in ['numbers', 'upper', 'lower']:
+            if os.path.isdir(os.path.join(font_path, subdir)):
+                for filename in os.listdir(os.path.join(font_path, subdir)):
+                    char, ext = os.path.splitext(filename)
+                    if ext == '.spr' and len(char) == 1:
+                        load(char, subdir, filename)
+        if os.path.isdir(os.path.join(font_path, 'misc')):
+            for filename in os.listdir(os.path.join(font_path, 'misc')):
+                ordinal, ext = os.path.splitext(filename)
+                if ext == '.spr' and ordinal.isdigit():
+                    load(chr(int(ordinal)), 'misc', filename)
+        load(' ', 'space.spr')
+        load(cls.UNKNOWN, 'unknown.spr')
+        return cls(font_name, glyphs)
+
+    @classmethod
+    def from_packed(cls, font_name, filename):
+        glyphs = {}
+        def add(name, lines):
+            if name is not None:
+                char = name if name == cls.UNKNOWN else chr(int(name))
+                glyphs[char] = Sprite('\n'.join(lines)).original_bitmap
+        name, lines = None, []
+        with open(filename) as f:
+            for line in f:
+                if line.startswith(cls.PACKED_GLYPH):
+                    add(name, lines)
+                    name, lines = line[len(cls.PACKED_GLYPH):].strip(), []
+                else:
+                    lines.append(line)
+        add(name, lines)
+        return cls(font_name, glyphs)
+
+    def write_packed(self, font_dir):
+        filename = os.path.join(font_dir, self.name + self.PACKED_SUFFIX)
+        with open(filename, 'w') as f:
+            for char, bitmap in sorted(self.glyphs.items()):
+                name = char if char == self.UNKNOWN else str(ord(char))
+                f.write(self.PACKED_GLYPH + name + '\n')
+                f.write(_color_array_to_str(bitmap, len(bitmap[0]), len(bitmap)))
+        return filename
+
+    def glyph(self, char):
+        '''Returns the bitmap of the given character.'''
+        if char.isspace():
+            char = ' '
+        return self.glyphs.get(char, self.unknown)
+
+    def compiled_glyph(self, char, char_spacing):
+        '''Returns the compiled columns (see `_compile_bitmap()`) of the given
+        character, followed by `char_spacing` transparent columns.'''
+        key = (char, char_spacing)
+        compiled = self._compiled_glyphs.get(key)
+        if compiled is None:
+            spacing = [[-1] * self.height] * char_spacing
+            compiled = _compile_bitmap(self.glyph(char) + spacing)
+            self._compiled_glyphs[key] = compiled
+        return compiled
+
+    def render(self, message, char_spacing):
+        '''Returns the bitmap of `message`, as a tuple of column tuples.'''
+        spacing = [(-1,) * self.height] * char_spacing
+        columns = []
+        for i, char in enumerate(message):
+            glyph = self.glyph(char)
+            if len(glyph[0]) != self.height:
+                raise ValueError("Can only add sprites of the same height")
+            if i:
+                columns.extend(spacing)
+            columns.extend(tuple(column) for column in glyph)
+        return tuple(columns)
+
+_text_cache = OrderedDict()
+_text_cache_lock = Lock()
+
+class ScrollingText(object):
+    '''A window onto a line of text, for scrolling marquees and tickers.
+
+    Unlike `Text`, `ScrollingText` never renders the whole message.  Only the
+    `width` columns currently visible in the window are produced each time it
+    is drawn, so the memory and time to draw it do not depend on the length of
+    the message.  Characters that have scrolled out of the left of the window
+    are discarded (so the text can not be scrolled back to them), and more text
+    can be added at any time with `append()`.
+
+    A `ScrollingText` is drawn on the `FrameBuffer` with the `FrameBuffer`'s
+    `draw()` function, like a `Sprite`.
+    '''
+    def __init__(self, message='', width=8, char_spacing=1, font_name='5x7',
+            font_dir=None, repeat=False):
+        '''Create a `ScrollingText` object.
+
+        `message` is the initial text.  `width` is the width of the window in
+        pixels (usually the width of the `FrameBuffer`).  `char_spacing`,
+        `font_name` and `font_dir` are the same as for `Text`.
+
+        The window starts just to the left of the text (so the text scrolls in
+        from the right edge).  If `repeat` is `True`, then each character that
+        scrolls out of the window is appended back onto the end, so the
+        message repeats forever.
+        '''
+        self._font = _Font.load(font_name, Text._font_dir(font_dir))
+        self._char_spacing = char_spacing
+        self._width = width
+        self._repeat = repeat
+        self._chars = deque()
+        # Text column of the first character in self._chars
+        self._first_column = 0
+        self.offset = -width
+        '''Text column that is at the left edge of the window.'''
+        self.append(message)
+
+    def append(self, message):
+        '''Adds `message` to the end of the text.
+
+        Returns itself, so this function can be chained.
+        '''
+        self._chars.extend(message)
+        return self
+
+    def _glyph(self, char):
+        return self._font.compiled_glyph(char, self._char_spacing)
+
+    def scroll(self, columns=1):
+        '''Scrolls the text `columns` pixels to the left (or to the right, if
+        negative).
+
+        The text can only be scrolled right as far as the first character that
+        has not yet scrolled out of the window (or, if none have, to anywhere).
+        Raises `ValueError` if it would scroll back to a discarded character.
+
+        Returns itself, so this function can be chained.
+        '''
+        if self._first_column > 0 and self.offset + columns < self._first_column:
+            raise ValueError('Can not scroll back to text that has scrolled out of the window')
+        self.offset += columns
+        # Discard characters that are now left of the window
+        while self._chars:
+            glyph_width = len(self._glyph(self._chars[0]))
+            if self._first_column + glyph_width > self.offset:
+                break
+            char = self._chars.popleft()
+            if self._repeat:
+                self._chars.append(char)
+            self._first_column += glyph_width
+        return self
+
+    def done(self):
+        '''Returns `True` if all of the text has scrolled out of the window.'''
+        return not self._chars
+
+    @property
+    def width(self):
+        '''Returns the width of the window.
+        '''
+        return self._width
+
+    @property
+    def height(self):
+        '''Returns the height of the text (the height of the font).
+        '''
+        return self._font.height
+
+    def _compiled(self):
+        blank = (bytes(self.height), [])
+        columns = []
+        column = self._first_column
+        end = self.offset + self._width
+        if column > self.offset:
+            columns.extend([blank] * (min(column, end) - self.offset))
+        for char in self._chars:
+            if column >= end:
+                break
+            glyph = self._glyph(char)
+            start = max(0, self.offset - column)
+            columns.extend(glyph[start:end - column])
+            column += len(glyph)
+        columns.extend([blank] * (self._width - len(columns)))
+        return columns
+
+    def __str__(self):
+        bitmap = [[color if runs and any(a <= y < b for a, b in runs) else -1
+            for y, color in enumerate(colors)] for colors, runs in self._compiled()]
+        return _color_array_to_str(bitmap, self.height, self.width)
+
+FrameTiming = namedtuple('FrameTiming', ['update', 'pack', 'transfer', 'idle'])
+'''Time spent (in seconds) in each phase of one frame of `FrameBuffer.run()`.
+
+`update` is the time spent in the caller's update function, `pack` and
+`transfer` are the time spent by `FrameBuffer.show()` packing and sending the
+frame, and `idle` is the time spent sleeping until the next frame.'''
+
+class FrameStats(object):
+    '''Timing statistics of a `FrameBuffer.run()` loop.
+
+    `frames` is the number of frames run, and `frames_skipped` is the number
+    of those that were not shown because the loop was behind schedule.
+    `timings` holds a `FrameTiming` for each of the most recent frames.
+    '''
+    def __init__(self, fps, history=100):
+        self.fps = fps
+        self.frames = 0
+        self.frames_skipped = 0
+        self.timings = deque(maxlen=history)
+
+    def _add(self, timing, skipped=False):
+        self.frames += 1
+        if skipped:
+            self.frames_skipped += 1
+        self.timings.append(timing)
+
+    def average(self):
+        '''Returns a `FrameTiming` of the average time of the recent frames.'''
+        if not self.timings:
+            return FrameTiming(0, 0, 0, 0)
+        return FrameTiming(*[sum(t)/len(self.timings) for t in zip(*self.timings)])
+
+    def headroom(self):
+        '''Returns the average fraction (0 to 1) of each frame spent idle.
+
+        A headroom near 0 means the loop is barely keeping up with its `fps`.
+        '''
+        return min(1.0, self.average().idle * self.fps)
+
+#
+# Transports
+#
+# A transport sends bitstreams to a chain of LED Matrices for a FrameBuffer.
+# It provides write(bitstream), which sends the bitstream and latches it into
+# the LED Matrices, and transfer(buffer), which does the same but also
+# replaces the contents of buffer with the bytes read back from the end of the
+# chain (MISO).  Lengths must be a multiple of MATRIX_SPI_SHIFT_REGISTER_LENGTH.
+#
+class SpiChain(object):
+    '''The chain of LED Matrices connected to the SPI bus.
+
+    This is the default transport of a `FrameBuffer`.
+    '''
+
+    #
+    # Chip enable now controlled manually outside of SPI led_driver.  See
+    # led_driver for details.
+    #
+    SPI_CE0_PIN = 8
+    chip_enable = None
+
+    def __init__(self):
+        init()
+
+    def write(self, bitstream):
+        '''Sends `bitstream` to the LED Matrices.'''
+        self.chip_enable.on()
+        led_driver.write(bitstream)
+        self.chip_enable.off()
+
+    def transfer(self, buffer):
+        '''Sends `buffer` to the LED Matrices, and replaces its contents with
+        the bytes read back from MISO.'''
+        self.chip_enable.on()
+        led_driver.transfer(buffer)
+        self.chip_enable.off()
+
+_init_lock = Lock()
+
+def init():
+    '''Initialize the SPI bus and the chip enable GPIO used by the LED Matrices.
+
+    This is done automatically when a `FrameBuffer` is created (or
+    `FrameBuffer.detect()` is called), so it is only needed to do the
+    initialization at a known time.
+    '''
+    led_driver.init_spi()
+    with _init_lock:
+        if SpiChain.chip_enable is None:
+            SpiChain.chip_enable = gpio.Output(SpiChain.SPI_CE0_PIN)
+
+ChainTransfer = namedtuple('ChainTransfer', ['time', 'length', 'duration'])
+'''A transfer to a `SimulatedChain`.
+
+`time` is when the transfer started (from `time.monotonic()`), `length` is the
+number of bytes sent, and `duration` is the time (in seconds) the transfer
+would take on the SPI bus.'''
+
+class SimulatedChain(object):
+    '''A simulated chain of LED Matrices, for running without the hardware.
+
+    A `SimulatedChain` can be given as the `transport` of a `FrameBuffer`
+    (or to `FrameBuffer.detect()`), in place of the LED Matrices on the SPI
+    bus.  It emulates the shift-register of the chain (32 bytes per LED
+    Matrix), so data read back from MISO, and therefore `detect()`, behave
+    as they would with real LED Matrices.
+
+    Use `matrix()` to see what each LED Matrix would display.  Each transfer
+    is recorded in `transfers`.
+    '''
+    def __init__(self, num_matrices=1, speed_hz=500000, byte_delay=5e-6,
+            realtime=False, history=1000):
+        '''Creates a chain of `num_matrices` LED Matrices.
+
+        `speed_hz` and `byte_delay` (in seconds) are the SPI clock speed and
+        delay between bytes, used to calculate how long each transfer would
+        take.  The defaults match the `led_driver`.  If `realtime=True`,
+        transfers take that long to return, as they do on real hardware.
+
+        `history` is the number of recent transfers kept in `transfers`.
+        '''
+        self.num_matrices = num_matrices
+        self.speed_hz = speed_hz
+        self.byte_delay = byte_delay
+        self.realtime = realtime
+        self.transfers = deque(maxlen=history)
+        '''`ChainTransfer` of each recent transfer.'''
+        self.bytes_sent = 0
+        self.bus_time = 0
+        '''Total time (in seconds) all transfers would take on the SPI bus.'''
+        # The shift-register contents, in the order the bytes will be shifted
+        # out (the first bytes belong to the last LED Matrix in the chain).
+        self._register = bytearray(num_matrices * MATRIX_SPI_SHIFT_REGISTER_LENGTH)
+        self._latched = bytes(self._register)
+        self._lock = Lock()
+
+    def _shift(self, data):
+        if len(data) % MATRIX_SPI_SHIFT_REGISTER_LENGTH:
+            raise IOError('Failed to read/write LED Matrices via SPI (bad len).')
+        start = time.monotonic()
+        duration = len(data) * (8.0 / self.speed_hz + self.byte_delay)
+        with self._lock:
+            shifted = self._register + data
+            received = shifted[:len(data)]
+            self._register[:] = shifted[len(data):]
+            # The LED Matrices latch their shift-registers at the end of the
+            # transfer (when chip enable goes inactive).
+            self._latched = bytes(self._register)
+            self.transfers.append(ChainTransfer(start, len(data), duration))
+            self.bytes_sent += len(data)
+            self.bus_time += duration
+        if self.realtime:
+            remaining = start + duration - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+        return received
+
+    def write(self, bitstream):
+        '''Sends `bitstream` to the LED Matrices.'''
+        self._shift(bitstream)
+
+    def transfer(self, buffer):
+        '''Sends `buffer` to the LED Matrices, and replaces its contents with
+        the bytes read back from MISO.'''
+        buffer[:] = self._shift(buffer)
+
+    def matrix(self, n):
+        '''Returns the pixels displayed by LED Matrix `n` in the chain.
+
+        The first LED Matrix in the chain (connected to MOSI) is 0.  The
+        pixels are returned as a list of 8 columns of 8 colors, indexed
+        [x][y] in the LED Matrix's own (unrotated) coordinates, with (0,0) at
+        its lower left.
+        '''
+        if not 0 <= n < self.num_matrices:
+            raise IndexError('LED Matrix {} is not in the chain'.format(n))
+        start = (self.num_matrices - 1 - n) * MATRIX_SPI_SHIFT_REGISTER_LENGTH
+        pixels = []
+        for byte in self._latched[start:start + MATRIX_SPI_SHIFT_REGISTER_LENGTH]:
+            pixels += [byte & 0x0F, byte >> 4]
+        return [pixels[x*8:(x + 1)*8] for x in range(8)]
+
+    def __str__(self):
+        return '\n'.join(
+            _color_array_to_str(self.matrix(n), 8, 8) for n in range(self.num_matrices))
+
+#
+# Dithering for FrameBuffer.blit_array()
+#
+_BAYER_4X4 = [
+    [ 0,  8,  2, 10],
+    [12,  4, 14,  6],
+    [ 3, 11,  1,  9],
+    [15,  7, 13,  5],
+    ]
+_bayer_thresholds = None
+
+def _numpy(feature):
+    # NumPy is only needed by a few FrameBuffer features, and is slow to
+    # import, so it is imported the first time one of them is used.
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('NumPy is required for FrameBuffer.' + feature) from None
+    return numpy
+
+def _ordered_thresholds(numpy):
+    '''Returns the 4x4 thresholds of ordered dithering, as a NumPy array.'''
+    global _bayer_thresholds
+    if _bayer_thresholds is None:
+        _bayer_thresholds = (numpy.array(_BAYER_4X4, dtype=numpy.float32) + 0.5) / 16
+    return _bayer_thresholds
+
+def _diffuse_errors(numpy, levels):
+    '''Floyd-Steinberg error diffusion of `levels`, an array indexed [x, y].
+
+    Returns an array of the integer levels, scanned from the top row down.
+    '''
+    width, height = levels.shape
+    columns = levels.tolist()
+    for y in reversed(range(height)):
+        for x in range(width):
+            old = columns[x][y]
+            new = min(max(math.floor(old + 0.5), 0), 15)
+            columns[x][y] = new
+            error = old - new
+            if x + 1 < width:
+                columns[x + 1][y] += error * 7/16
+            if y > 0:
+                if x > 0:
+                    columns[x - 1][y - 1] += error * 3/16
+                columns[x][y - 1] += error * 5/16
+                if x + 1 < width:
+                    columns[x + 1][y - 1] += error * 1/16
+    return numpy.array(columns)
 
 class FrameBuffer(object):
     ''' A framebuffer that maps to a chain of LED Matrix Ready Set STEM Cells.  
@@ -300,14 +924,7 @@ class FrameBuffer(object):
     15 is the highest brightness.
     '''
 
-    #
-    # Chip enable now controlled manually outside of SPI led_driver.  See
-    # led_driver for details.
-    #
-    SPI_CE0_PIN = 8
-    chip_enable = gpio.Output(SPI_CE0_PIN)
-
-    def __init__(self, matrix_layout=None):
+    def __init__(self, matrix_layout=None, async_show=False, transport=None):
         ''' Initialize the `rstem.led_matrix.FrameBuffer`.  
         
         If `matrix_layout` is not given (the default), then the LED Matrix
@@ -357,9 +974,22 @@ class FrameBuffer(object):
         (however, not all of the framebuffer data will necessarily be displayed).
 
         SPI CE0 is always used.
+
+        If `async_show=True`, then `show()` does not wait for the framebuffer
+        to be sent to the LED Matrices.  Instead, a background thread sends
+        the most recently shown frame while the caller draws the next one.  If
+        `show()` is called again before the previous frame was sent, the
+        previous frame is dropped (see `frames_dropped`).  Use
+        `wait_presented()` to wait until the last shown frame has been sent,
+        and `close()` (or a `with` statement) to stop the background thread.
+
+        `transport` is the chain of LED Matrices to send the framebuffer to.
+        By default, it is the LED Matrices on the SPI bus (a `SpiChain`).  To
+        run without the hardware, give a `SimulatedChain`.
         '''
+        self._transport = transport if transport else SpiChain()
         if not matrix_layout:
-            num_matrices = self.detect()
+            num_matrices = self.detect(self._transport)
             if num_matrices == 0:
                 raise IOError('No LED Matrices connected')
             elif num_matrices > 8:
@@ -388,11 +1018,122 @@ class FrameBuffer(object):
             [(x, y, _quarter_clockwise_rotations(angle)) for x, y, angle in matrix_layout]
 
         self.matrix_layout = matrix_layout
-        self.fb = [[0]*(maxy + 8) for i in range(maxx + 8)]
-        led_driver.init_spi()
+
+        # The framebuffer is stored as one flat bytearray, one byte per pixel,
+        # in column order (i.e. pixel (x, y) is at index x*height + y).  Each
+        # column is also available as a memoryview, so drawing functions can
+        # write whole column slices at once.
+        self._width, self._height = maxx + 8, maxy + 8
+        self._fb = bytearray(self._width * self._height)
+        self._columns = self._column_views(self._fb)
+
+        # The matrix_layout is compiled once into a table of framebuffer
+        # indices, in the order the pixels are sent over SPI.  show() then
+        # only needs to gather and pack the pixels (in C) via this table.
+        self._layout_table = self._compile_layout(matrix_layout)
+        self._bitstream = bytearray(len(self._layout_table) // 2)
+        self._shown_bitstream = None
+
+        self.frame_stats = None
+        '''`FrameStats` of the current (or last) `run()` loop.'''
+        self._last_pack_time = 0
+        self._last_transfer_time = 0
+
+        self.frames_dropped = 0
+        '''Number of frames shown, but never sent, because `show()` was called
+        again before they could be sent (only when `async_show=True`).'''
+        self._async_show = async_show
+        if async_show:
+            # Double buffered: show() packs into self._bitstream (the back
+            # buffer), and the presenter thread swaps it with
+            # self._front_bitstream before sending it.
+            self._front_bitstream = bytearray(len(self._bitstream))
+            self._pending = False
+            self._frames_submitted = 0
+            self._frames_presented = 0
+            self._present_error = None
+            self._closed = False
+            self._present_condition = Condition()
+            self._presenter_thread = Thread(target=self.__presenter_thread, args=())
+            self._presenter_thread.daemon = True
+            self._presenter_thread.start()
+
+    def __presenter_thread(self):
+        while True:
+            with self._present_condition:
+                while not self._pending and not self._closed:
+                    self._present_condition.wait()
+                if not self._pending:
+                    return
+                self._bitstream, self._front_bitstream = \
+                    self._front_bitstream, self._bitstream
+                self._pending = False
+                frame = self._frames_submitted
+
+            # Send without holding the lock, so show() can pack the next frame.
+            error = None
+            try:
+                self._transmit(self._front_bitstream)
+            except Exception as e:
+                error = e
+
+            with self._present_condition:
+                self._frames_presented = frame
+                if error:
+                    self._present_error = error
+                    self._shown_bitstream = None
+                self._present_condition.notify_all()
+
+    def _compile_layout(self, matrix_layout):
+        table = array('I')
+        forward = range(8)
+        backward = list(reversed(forward))
+        for xoff, yoff, quarter_clockwise_rotations in reversed(matrix_layout):
+            if quarter_clockwise_rotations == 0:
+                pixels = [(x, y) for x in forward for y in forward]
+            elif quarter_clockwise_rotations == 1:
+                pixels = [(x, y) for y in backward for x in forward]
+            elif quarter_clockwise_rotations == 2:
+                pixels = [(x, y) for x in backward for y in backward]
+            elif quarter_clockwise_rotations == 3:
+                pixels = [(x, y) for y in forward for x in backward]
+            else:
+                raise RuntimeException('Internal Error: Invalid rotation')
+            table.extend((xoff + x)*self._height + yoff + y for x, y in pixels)
+        return table
+
+    def _column_views(self, storage):
+        view = memoryview(storage)
+        return [view[x*self._height:(x + 1)*self._height] for x in range(self._width)]
 
     def _framebuffer(self):
-        return self.fb
+        return [list(column) for column in self._columns]
+
+    @property
+    def buffer(self):
+        '''Returns a writable `memoryview` of the framebuffer storage.
+
+        The framebuffer is one byte per pixel, in column order: pixel (x, y)
+        is at index `x*height + y`.
+        '''
+        return memoryview(self._fb)
+
+    def column(self, x):
+        '''Returns a writable `memoryview` of column `x` of the framebuffer.
+
+        Index `y` of the returned view is pixel (`x`, `y`).
+        '''
+        return self._columns[x]
+
+    @property
+    def array(self):
+        '''Returns a NumPy array that shares memory with the framebuffer.
+
+        The array has shape (width, height), and is indexed as [x, y].
+        Requires NumPy.
+        '''
+        numpy = _numpy('array')
+        return numpy.frombuffer(self._fb, dtype=numpy.uint8).reshape(self._width, self._height)
 
     def point(self, x, y=None, color=0xF):
         ''' Draw point (`x`, `y`) in the framebuffer, using the given `color`.
@@ -406,7 +1147,8 @@ class FrameBuffer(object):
 
             fb.point((2,3))
 
-        The point is drawn in the given `color`.
+        The point is drawn in the given `color`.  Colors above 15 are drawn as
+        15, and negative colors are transparent (nothing is drawn).
         '''
         try:
             if y == None:
@@ -414,7 +1156,7 @@ class FrameBuffer(object):
             if x < 0 or y < 0:
                 raise IndexError
             if color >= 0:
-                self.fb[x][y] = color
+                self._columns[x][y] = min(color, 0xF)
         except IndexError:
             pass
 
@@ -422,10 +1164,9 @@ class FrameBuffer(object):
         '''Erase all pixels in the framebuffer
 
         `color`, if given, can fill the framebuffer with a specific color.
+        Colors are clamped to 0-15.
         '''
-        for x in range(self.width):
-            for y in range(self.height):
-                self.fb[x][y] = color
+        self._fb[:] = bytes((min(max(color, 0), 0xF),)) * len(self._fb)
 
     def line(self, point_a, point_b, color=0xF):
         '''Draw a line in the framebuffer from `point_a` to `point_b`.
@@ -468,50 +1209,436 @@ class FrameBuffer(object):
         width, height = dimensions
 
         if fill:
-            for x_offset in range(width):
-                self.line((x + x_offset, y), (x + x_offset, y + height - 1), color)
+            self._fill_spans(x, x + width, y, y + height, color)
         else:
             self.line((x, y), (x, y + height - 1), color)
             self.line((x, y + height - 1), (x + width - 1, y + height - 1), color)
             self.line((x + width - 1, y + height - 1), (x + width - 1, y), color)
             self.line((x + width - 1, y), (x, y), color)
-        
-    def show(self):
+
+    def _fill_spans(self, x0, x1, y0, y1, color):
+        # Fills columns x0 <= x < x1 from y0 <= y < y1, clipped to the
+        # framebuffer, with one slice write per column.
+        x0, x1 = max(x0, 0), min(x1, self._width)
+        y0, y1 = max(y0, 0), min(y1, self._height)
+        if x0 >= x1 or y0 >= y1 or color < 0:
+            return
+        color = min(color, 0xF)
+        if y0 == 0 and y1 == self._height:
+            # Full height columns are contiguous in the framebuffer
+            self._fb[x0*self._height:x1*self._height] = bytes((color,)) * ((x1 - x0)*self._height)
+        else:
+            span = bytes((color,)) * (y1 - y0)
+            for x in range(x0, x1):
+                self._columns[x][y0:y1] = span
+
+    def circle(self, center, radius, fill=False, color=0xF):
+        '''Draws a circle in the framebuffer.
+
+        The circle is centered on the point `center`, and has the given
+        `radius` (a radius of 0 is a single point).  If `fill` is True, then
+        the interior of the circle will be filled.  Otherwise, only the
+        outside edge of the circle will be drawn.  The circle is drawn in the
+        given `color`.
+        '''
+        xcenter, ycenter = center
+        if radius < 0:
+            return
+        # Half height of each column of the circle (-1 outside the circle).
+        # Pixels within radius + 1/2 of the center are in the circle.
+        half_heights = [-1] + [
+            int(math.sqrt(radius*radius + radius - dx*dx)) for dx in range(-radius, radius + 1)
+            ] + [-1]
+        for i, dx in enumerate(range(-radius, radius + 1), 1):
+            half_height = half_heights[i]
+            x = xcenter + dx
+            if fill:
+                self._fill_spans(x, x + 1, ycenter - half_height, ycenter + half_height + 1, color)
+            else:
+                # Edge pixels are those next to a pixel outside the circle.
+                inner = min(half_heights[i - 1], half_heights[i + 1], half_height - 1)
+                self._fill_spans(x, x + 1, ycenter + inner + 1, ycenter + half_height + 1, color)
+                self._fill_spans(x, x + 1, ycenter - half_height, ycenter - inner, color)
+
+    def polygon(self, points, fill=False, color=0xF):
+        '''Draws a closed polygon in the framebuffer.
+
+        `points` is a list of the (x, y) vertices of the polygon.  Lines are
+        drawn between each consecutive point, and from the last point back to
+        the first.  If `fill` is True, then the interior of the polygon will
+        also be filled.  The polygon is drawn in the given `color`.
+        '''
+        points = list(points)
+        edges = list(zip(points, points[1:] + points[:1]))
+        if fill and points:
+            # Scan each column, and fill between pairs of edge crossings.
+            xs = [x for x, y in points]
+            for x in range(max(min(xs), 0), min(max(xs), self._width - 1) + 1):
+                crossings = []
+                for (x0, y0), (x1, y1) in edges:
+                    if x0 <= x < x1 or x1 <= x < x0:
+                        crossings.append(y0 + (x - x0)*(y1 - y0)/(x1 - x0))
+                crossings.sort()
+                for ylow, yhigh in zip(crossings[::2], crossings[1::2]):
+                    self._fill_spans(x, x + 1, math.ceil(ylow), math.floor(yhigh) + 1, color)
+        for point_a, point_b in edges:
+            self.line(point_a, point_b, color)
+
+    def flood_fill(self, point, color=0xF):
+        '''Fills the area around `point` with the given `color`.
+
+        All pixels that are the same color as `point`, and connected to it
+        (horizontally or vertically) by pixels of that same color, are filled.
+        '''
+        x, y = point
+        if not (0 <= x < self._width and 0 <= y < self._height) or color < 0:
+            return
+        target = bytes((self._columns[x][y],))
+        if target[0] == color:
+            return
+        seeds = [(x, y)]
+        while seeds:
+            x, y = seeds.pop()
+            column = self._columns[x]
+            if column[y] != target[0]:
+                continue
+            # Find the run of target pixels in this column that includes y
+            low = len(column[:y].tobytes().rstrip(target))
+            above = column[y:].tobytes()
+            high = y + len(above) - len(above.lstrip(target))
+            column[low:high] = bytes((color,)) * (high - low)
+
+            # Seed each run of target pixels next to the filled run
+            for next_x in (x - 1, x + 1):
+                if 0 <= next_x < self._width:
+                    neighbors = self._columns[next_x][low:high].tobytes()
+                    start = neighbors.find(target)
+                    while start >= 0:
+                        seeds.append((next_x, low + start))
+                        end = len(neighbors) - len(neighbors[start:].lstrip(target))
+                        start = neighbors.find(target, end)
+
+    def scroll(self, dx=0, dy=0, fill=0, wrap=False, origin=(0,0), dimensions=None):
+        '''Scrolls the contents of the framebuffer by (`dx`, `dy`) pixels.
+
+        A positive `dx` moves the contents right, and a positive `dy` moves
+        them up.  Pixels scrolled off an edge are lost, and the exposed edge
+        is filled with the `fill` color.  If `wrap` is True, pixels scrolled
+        off one edge reappear on the opposite edge instead.
+
+        By default the whole framebuffer is scrolled.  To scroll only part of
+        it, give the lower left `origin` and the `dimensions` (a 2-tuple of
+        the width and height) of the region to scroll.  Pixels outside the
+        region are not changed.
+        '''
+        x, y = origin
+        if dimensions == None:
+            dimensions = (self._width - x, self._height - y)
+        width, height = dimensions
+        x0, x1 = max(x, 0), min(x + width, self._width)
+        y0, y1 = max(y, 0), min(y + height, self._height)
+        width, height = x1 - x0, y1 - y0
+        if width <= 0 or height <= 0:
+            return
+        if wrap:
+            dx %= width
+            dy %= height
+        if dx:
+            self._scroll_columns(x0, x1, y0, y1, dx, fill, wrap)
+        if dy:
+            self._scroll_rows(x0, x1, y0, y1, dy, fill, wrap)
+
+    def _scroll_columns(self, x0, x1, y0, y1, dx, fill, wrap):
+        # Moves whole columns of the region right by dx (or left if negative)
+        width = x1 - x0
+        if not wrap and abs(dx) >= width:
+            self._fill_spans(x0, x1, y0, y1, fill)
+            return
+        if y0 == 0 and y1 == self._height:
+            # Full height columns are contiguous, so the move is one memmove
+            view = memoryview(self._fb)
+            start, stop, shift = x0*self._height, x1*self._height, dx*self._height
+            if wrap:
+                view[start:stop] = view[stop - shift:stop].tobytes() + view[start:stop - shift].tobytes()
+            elif dx > 0:
+                view[start + shift:stop] = view[start:stop - shift]
+            else:
+                view[start:stop + shift] = view[start - shift:stop]
+        else:
+            spans = [self._columns[x][y0:y1].tobytes() for x in range(x0, x1)]
+            spans = spans[-dx:] + spans[:-dx]
+            for x, span in zip(range(x0, x1), spans):
+                self._columns[x][y0:y1] = span
+        if not wrap:
+            if dx > 0:
+                self._fill_spans(x0, x0 + dx, y0, y1, fill)
+            else:
+                self._fill_spans(x1 + dx, x1, y0, y1, fill)
+
+    def _scroll_rows(self, x0, x1, y0, y1, dy, fill, wrap):
+        # Moves the region within each column up by dy (or down if negative)
+        height = y1 - y0
+        if not wrap and abs(dy) >= height:
+            self._fill_spans(x0, x1, y0, y1, fill)
+            return
+        if wrap:
+            for x in range(x0, x1):
+                column = self._columns[x]
+                column[y0:y1] = column[y1 - dy:y1].tobytes() + column[y0:y1 - dy].tobytes()
+            return
+        if y0 == 0 and y1 == self._height and fill >= 0:
+            # Move all columns with one memmove.  Pixels that move across a
+            # column boundary land in the exposed edge, which is filled below.
+            view = memoryview(self._fb)
+            start, stop = x0*self._height, x1*self._height
+            if dy > 0:
+                view[start + dy:stop] = view[start:stop - dy]
+            else:
+                view[start:stop + dy] = view[start - dy:stop]
+        else:
+            for x in range(x0, x1):
+                column = self._columns[x]
+                if dy > 0:
+                    column[y0 + dy:y1] = column[y0:y1 - dy]
+                else:
+                    column[y0:y1 + dy] = column[y0 - dy:y1]
+        if dy > 0:
+            self._fill_spans(x0, x1, y0, y0 + dy, fill)
+        else:
+            self._fill_spans(x0, x1, y1 + dy, y1, fill)
+
+    def blit_array(self, image, origin=(0,0), scale=1, dither=None):
+        '''Draws the NumPy array `image` as a greyscale image in the framebuffer.
+
+        `image` is a 2-D array of rows of pixels, with the first row at the
+        top, as is usual for images (for example, frames from OpenCV).  A 3-D
+        array of color pixels is converted to grey by averaging its color
+        channels.  Integer arrays have pixel values from 0-255, and float
+        arrays from 0.0-1.0.  Pixels are quantised to the 16 colors of the
+        framebuffer.
+
+        The `origin` is the lower left position of the image in the
+        framebuffer.  The image is clipped to the framebuffer.
+
+        If `scale` is greater than 1, the image is scaled down by averaging
+        each `scale` x `scale` block of pixels into one pixel.  `scale` can
+        also be a 2-tuple of the horizontal and vertical scale.  Rows and
+        columns at the edges of the image that do not fill a whole block are
+        ignored.
+
+        `dither` selects how pixels are quantised:
+            None:           Each pixel is rounded to the nearest color.
+            'ordered':      Ordered dithering with a 4x4 Bayer matrix.
+            'diffusion':    Floyd-Steinberg error diffusion.
+
+        Requires NumPy.
+        '''
+        numpy = _numpy('blit_array')
+        if dither not in (None, 'ordered', 'diffusion'):
+            raise ValueError("dither must be None, 'ordered' or 'diffusion'")
+        image = numpy.asarray(image)
+        if image.ndim not in (2, 3):
+            raise ValueError('image must be a 2-D or 3-D array')
+        try:
+            xscale, yscale = scale
+        except TypeError:
+            xscale = yscale = scale
+        if xscale < 1 or yscale < 1:
+            raise ValueError('scale must be 1 or more')
+        max_value = 1.0 if image.dtype.kind in 'fb' else 255.0
+
+        # Clip the scaled image to the framebuffer, before doing any work on it.
+        x, y = origin
+        width, height = image.shape[1] // xscale, image.shape[0] // yscale
+        x0, x1 = max(x, 0), min(x + width, self._width)
+        y0, y1 = max(y, 0), min(y + height, self._height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        first_row, last_row = y + height - y1, y + height - y0
+        image = image[first_row*yscale:last_row*yscale, (x0 - x)*xscale:(x1 - x)*xscale]
+
+        if image.ndim == 3:
+            image = image.mean(axis=2, dtype=numpy.float32)
+        if xscale > 1 or yscale > 1:
+            image = image.reshape(y1 - y0, yscale, x1 - x0, xscale).mean(axis=(1, 3), dtype=numpy.float32)
+        # Quantise in framebuffer order: indexed [x, y] with y up.
+        levels = image[::-1].T * numpy.float32(15.0 / max_value)
+
+        if dither == 'ordered':
+            # Thresholds are fixed to framebuffer positions, so the pattern
+            # does not crawl as the image changes.
+            xs = numpy.arange(x0, x1)[:, None] % 4
+            ys = numpy.arange(y0, y1)[None, :] % 4
+            levels = numpy.floor(levels + _ordered_thresholds(numpy)[xs, ys])
+        elif dither == 'diffusion':
+            levels = _diffuse_errors(numpy, levels)
+        else:
+            levels = numpy.rint(levels)
+        self.array[x0:x1, y0:y1] = numpy.clip(levels, 0, 15)
+
+    def show(self, force=False):
         '''Send the framebuffer to the LED Matrices.
 
         Sends the current framebuffer to the LED Matrices over the SPI bus,
         according to the layout defined when the framebuffer was initialized.
         This will cause the framebuffer to be displayed on the LED Matrix(es).
+
+        If the framebuffer has not changed since the last time it was sent,
+        nothing is sent (the LED Matrices are already displaying it), unless
+        `force=True`.  Use `force=True` if the LED Matrices may have been
+        changed by something else (for example, by `detect()`, or by being
+        power cycled).
+
+        If the `FrameBuffer` was created with `async_show=True`, this function
+        returns as soon as the frame is queued, without waiting for it to be
+        sent.
         '''
-        bitstream = b''
-        for xoff, yoff, quarter_clockwise_rotations in reversed(self.matrix_layout):
-            forward = range(8)
-            backward = list(reversed(forward))
-            if quarter_clockwise_rotations == 0:
-                flat = [self.fb[xoff + x][yoff + y] for x in forward for y in forward]
-            elif quarter_clockwise_rotations == 1:
-                flat = [self.fb[xoff + x][yoff + y] for y in backward for x in forward]
-            elif quarter_clockwise_rotations == 2:
-                flat = [self.fb[xoff + x][yoff + y] for x in backward for y in backward]
-            elif quarter_clockwise_rotations == 3:
-                flat = [self.fb[xoff + x][yoff + y] for y in forward for x in backward]
+        if not self._async_show:
+            if self._pack() or force:
+                try:
+                    self._transmit(self._bitstream)
+                except:
+                    self._shown_bitstream = None
+                    raise
             else:
-                raise RuntimeException('Internal Error: Invalid rotation')
-            even = flat[::2]
-            odd = flat[1::2]
-            bitstream += bytes(b[0] | (b[1] << 4) for b in zip(even, odd))
-        FrameBuffer.chip_enable.on()
-        led_driver.send(bitstream)
-        FrameBuffer.chip_enable.off()
+                self._last_transfer_time = 0
+            return
+
+        with self._present_condition:
+            if self._present_error:
+                error, self._present_error = self._present_error, None
+                raise error
+            if self._pack() or force:
+                if self._pending:
+                    self.frames_dropped += 1
+                self._pending = True
+                self._frames_submitted += 1
+                self._present_condition.notify_all()
+
+    def _pack(self):
+        # Packs the framebuffer into the (back) bitstream.  Returns True if it
+        # differs from the last bitstream shown.
+        start = time.monotonic()
+        led_driver.pack(self._fb, self._layout_table, self._bitstream)
+        self._last_pack_time = time.monotonic() - start
+        if self._bitstream == self._shown_bitstream:
+            return False
+        self._shown_bitstream = bytes(self._bitstream)
+        return True
+
+    def wait_presented(self, timeout=None):
+        '''Wait until the last shown frame has been sent to the LED Matrices.
+
+        Only useful if the `FrameBuffer` was created with `async_show=True` -
+        otherwise, `show()` has already waited and this returns immediately.
+
+        If `timeout=None` (the default), the function will block until the
+        frame is sent.  Otherwise, it will block for up to `timeout` seconds.
+        Returns `True` if the frame was sent, or `False` on timeout.
+        '''
+        if not self._async_show:
+            return True
+        with self._present_condition:
+            return self._present_condition.wait_for(
+                lambda: self._frames_presented == self._frames_submitted, timeout)
+
+    def close(self):
+        '''Stop the background thread that sends frames.
+
+        Only useful if the `FrameBuffer` was created with `async_show=True`.
+        The last shown frame is sent first.  Afterwards, `show()` sends the
+        framebuffer itself, as if created with `async_show=False`.
+
+        A `FrameBuffer` can also be used in a `with` statement, which closes
+        it at the end.
+        '''
+        if not self._async_show:
+            return
+        with self._present_condition:
+            self._closed = True
+            self._present_condition.notify_all()
+        self._presenter_thread.join()
+        self._async_show = False
+        if self._present_error:
+            error, self._present_error = self._present_error, None
+            raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _transmit(self, bitstream):
+        start = time.monotonic()
+        self._transport.write(bitstream)
+        self._last_transfer_time = time.monotonic() - start
+
+    def run(self, update, fps=30, max_frame_skip=5):
+        '''Run a game loop at a fixed frame rate.
+
+        `update` is a function that is called once per frame, with no
+        arguments.  It should update the game state and draw the next frame
+        into the framebuffer.  After each call, the frame is shown, and the
+        loop sleeps until it is time for the next frame.  The loop ends when
+        `update` returns `False`.
+
+        `fps` is the number of frames per second.  The loop keeps time with a
+        monotonic clock, so it does not drift, even if `update` and `show()`
+        take a varying amount of time.
+
+        If the loop falls behind (because `update` and `show()` together take
+        longer than a frame), then frames are skipped: `update` is still
+        called, but the frame is not shown, so the game runs at the same speed.
+        At most `max_frame_skip` frames in a row are skipped.
+
+        Returns a `FrameStats` object with the timing of the loop (also
+        available as `frame_stats` while the loop is running).
+        '''
+        period = 1.0 / fps
+        stats = self.frame_stats = FrameStats(fps)
+        skipped = 0
+        next_frame = time.monotonic()
+        while True:
+            start = time.monotonic()
+            if update() is False:
+                break
+            update_time = time.monotonic() - start
+            next_frame += period
+
+            if time.monotonic() > next_frame and skipped < max_frame_skip:
+                # Behind schedule, skip showing this frame to catch up.
+                skipped += 1
+                stats._add(FrameTiming(update_time, 0, 0, 0), skipped=True)
+                continue
+            skipped = 0
+
+            self.show()
+
+            idle = next_frame - time.monotonic()
+            if idle > 0:
+                time.sleep(idle)
+            else:
+                if -idle > period * max_frame_skip:
+                    # Hopelessly behind - restart the schedule from now.
+                    next_frame = time.monotonic()
+                idle = 0
+            stats._add(FrameTiming(
+                update_time, self._last_pack_time, self._last_transfer_time, idle))
+        return stats
 
     @staticmethod
-    def detect():
+    def detect(transport=None):
         '''Returns the number of matrices connected.  
         
         Requires matrices connected in a full chain from MOSI back to MISO on
         the Raspberry Pi.
+
+        `transport` is the chain of LED Matrices to detect (by default, the
+        LED Matrices on the SPI bus).
         '''
-        led_driver.init_spi()
+        if not transport:
+            transport = SpiChain()
 
         # Matrix chain forms one long shift-register, of N * B, where N is the
         # number of matrices, and B is the length of the shift-register in each
@@ -521,10 +1648,8 @@ class FrameBuffer(object):
         # can detect the length by push a string of bytes longer than the max
         # through the chain.
         rand = os.urandom(32)
-        sequence = rand + bytes(MAX_MATRICES * MATRIX_SPI_SHIFT_REGISTER_LENGTH)
-        FrameBuffer.chip_enable.on()
-        recv = led_driver.send(sequence)
-        FrameBuffer.chip_enable.off()
+        recv = bytearray(rand + bytes(MAX_MATRICES * MATRIX_SPI_SHIFT_REGISTER_LENGTH))
+        transport.transfer(recv)
 
         # Search the received bytes for the random sequence.  The offset
         # determines the number of matrices in the chain
@@ -543,7 +1668,7 @@ class FrameBuffer(object):
 
         The width depends upon the matrix layout.
         '''
-        return len(self.fb)
+        return self._width
 
     @property
     def height(self):
@@ -551,10 +1676,10 @@ class FrameBuffer(object):
 
         The height depends upon the matrix layout.
         '''
-        return len(self.fb[0])
+        return self._height
 
     def __str__(self):
-        return _color_array_to_str(self.fb, self.height, self.width)
+        return _color_array_to_str(self._columns, self.height, self.width)
 
     def draw(self, drawable, origin=(0,0)):
         '''Draw `drawable` into the framebuffer, at given origin.
@@ -562,13 +1687,24 @@ class FrameBuffer(object):
         `drawable` is either a `Sprite` or `Text` object.
         '''
         xorig, yorig = origin
-        bitmap = drawable._bitmap()
-        if not bitmap:
+        compiled = drawable._compiled()
+        if not compiled:
             return
-        width, height = len(bitmap), len(bitmap[0])
-        for x in range(width):
-            for y in range(height):
-                self.point(xorig + x, yorig + y, bitmap[x][y])
+        width, height = len(compiled), len(compiled[0][0])
 
-__all__ = ['FrameBuffer', 'Sprite', 'Text']
+        # Clip the drawable to the framebuffer once, then copy each run of
+        # opaque pixels as a slice.
+        ystart, yend = max(0, -yorig), min(height, self.height - yorig)
+        if ystart >= yend:
+            return
+        for x in range(max(0, -xorig), min(width, self.width - xorig)):
+            colors, runs = compiled[x]
+            column = self._columns[xorig + x]
+            for start, stop in runs:
+                start, stop = max(start, ystart), min(stop, yend)
+                if start < stop:
+                    column[yorig + start:yorig + stop] = colors[start:stop]
+
+__all__ = ['FrameBuffer', 'Sprite', 'Text', 'ScrollingText', 'FrameStats', 'FrameTiming',
+    'SpiChain', 'SimulatedChain', 'ChainTransfer', 'init']
         
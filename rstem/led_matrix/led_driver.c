@@ -15,6 +15,7 @@
  * See the License for the specific language governing permissions and
  * limitations under the License.
  */
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
 #include <stdio.h>
 #include <stdlib.h>
@@ -38,6 +39,16 @@
 #define SPI_SPEED 500000
 #define SPI_DELAY 5 
 
+//
+// Maximum number of transfers in one SPI_IOC_MESSAGE() ioctl.  The kernel
+// encodes the size of the transfer array in the ioctl number, which limits it
+// to (1 << _IOC_SIZEBITS) - 1 bytes.  It is rounded down to a whole number of
+// LED Matrix shift-registers.
+//
+#define SPI_MAX_TRANSFERS \
+    ((((1 << _IOC_SIZEBITS) - 1) / sizeof(struct spi_ioc_transfer)) \
+        / MATRIX_SPI_SHIFT_REGISTER_LENGTH * MATRIX_SPI_SHIFT_REGISTER_LENGTH)
+
 int spi;
 unsigned char spi_mode;
 unsigned char bits_per_trans;
@@ -86,37 +97,75 @@ out:
     return spi;
 }
 
-int rw_bytes(int dev, char * val, char * buff, int len){
-    struct spi_ioc_transfer tr[MATRIX_SPI_SHIFT_REGISTER_LENGTH];
-    int i, j;
+int rw_bytes(int dev, const char * val, char * buff, Py_ssize_t len){
+    struct spi_ioc_transfer tr[SPI_MAX_TRANSFERS];
+    Py_ssize_t i, j, n;
     int ret = 0;
 
     //
-    // SPI transfers are done in blocks of MATRIX_SPI_SHIFT_REGISTER_LENGTH at
-    // a time.  We do transfers of one byte each, as this is the only way to
-    // include an inter-byte delay (see SPI_DELAY).  We do just
-    // MATRIX_SPI_SHIFT_REGISTER_LENGTH at a time, because the largest
-    // transfers would exceed the ioctl() capability (so we break it into
-    // MATRIX_SPI_SHIFT_REGISTER_LENGTH chunks).
+    // We do transfers of one byte each, as this is the only way to include an
+    // inter-byte delay (see SPI_DELAY).  As many transfers as the ioctl()
+    // allows are sent at once (see SPI_MAX_TRANSFERS), so long chains only
+    // need a few syscalls per frame.
+    //
+    // If buff is NULL, the received bytes are discarded (no readback).
+    // Otherwise, buff may be the same as val, in which case the received
+    // bytes overwrite the sent bytes.
+    //
+    // This function does not touch any Python objects, so it can (and
+    // should) be called without holding the GIL.
     //
     // Final note: because CE0 is at the mercy of the driver, and the LED
     // Matrices require CE0 active for the full transaction (the end of CE0
     // indicates when to show the framebuffer on the display), CE0 is handled
     // manually outside of this driver.
     //
-    for (i = 0; i < len; i += MATRIX_SPI_SHIFT_REGISTER_LENGTH) {
-        memset(tr, 0, sizeof(tr));
-        for (j = 0; j < MATRIX_SPI_SHIFT_REGISTER_LENGTH; j++) {
+    for (i = 0; i < len; i += n) {
+        n = len - i < SPI_MAX_TRANSFERS ? len - i : SPI_MAX_TRANSFERS;
+        memset(tr, 0, n * sizeof(tr[0]));
+        for (j = 0; j < n; j++) {
             tr[j].tx_buf = (unsigned long) &val[i+j];
-            tr[j].rx_buf = (unsigned long) &buff[i+j];
+            tr[j].rx_buf = buff ? (unsigned long) &buff[i+j] : 0;
             tr[j].len = 1;
             tr[j].delay_usecs = SPI_DELAY;
         }
-        ret = ioctl(dev, SPI_IOC_MESSAGE(MATRIX_SPI_SHIFT_REGISTER_LENGTH), tr);
+        ret = ioctl(dev, SPI_IOC_MESSAGE(n), tr);
+        if (ret < 0) {
+            break;
+        }
     }
     return ret;
 }
 
+//
+// Pack the framebuffer into the SPI bitstream.
+//
+// The framebuffer is one byte per pixel.  The table holds one framebuffer
+// index per pixel, in the order the pixels are to be sent to the LED
+// Matrices.  Two pixels are packed per byte, first pixel in the low nibble.
+//
+// Returns 0 on success, -1 if the table references a pixel outside of the
+// framebuffer.
+//
+int pack_bytes(
+    const unsigned char * fb, Py_ssize_t fb_len,
+    const unsigned int * table, Py_ssize_t table_len,
+    unsigned char * out)
+{
+    Py_ssize_t i;
+    unsigned int even, odd;
+
+    for (i = 0; i < table_len; i += 2) {
+        even = table[i];
+        odd = table[i+1];
+        if (even >= fb_len || odd >= fb_len) {
+            return -1;
+        }
+        out[i/2] = (fb[even] & 0x0F) | ((fb[odd] & 0x0F) << 4);
+    }
+    return 0;
+}
+
 // Python Wrappers =================================================
 
 
@@ -130,27 +179,124 @@ static PyObject *py_init_spi(PyObject *self, PyObject *args){
     return Py_BuildValue("");
 }   
 
+//
+// Sends len bytes from val via SPI, with the GIL released.  Received bytes
+// are written to buff (if not NULL).  Returns -1 with a Python exception set
+// on failure.
+//
+static int send_bytes(const char * val, char * buff, Py_ssize_t len){
+    int dev = spi;
+    int ret;
+
+    if (len % MATRIX_SPI_SHIFT_REGISTER_LENGTH) {
+        PyErr_SetString(PyExc_IOError, "Failed to read/write LED Matrices via SPI (bad len).");
+        return -1;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    ret = rw_bytes(dev, val, buff, len);
+    Py_END_ALLOW_THREADS
+    if (ret < 0) {
+        PyErr_SetString(PyExc_IOError, "Failed to read/write LED Matrices via SPI (bad IO).");
+        return -1;
+    }
+    return 0;
+}
+
 static PyObject *py_send(PyObject *self, PyObject *args){
+    Py_buffer data;
+    PyObject *recv;
     char *s;
-    int len;
-    if(!PyArg_ParseTuple(args, "y#", &s, &len)){
-        PyErr_SetString(PyExc_TypeError, "Not an unsigned int!");
+    int err;
+
+    if(!PyArg_ParseTuple(args, "y*", &data)){
         return NULL;
     }
-    if (len % MATRIX_SPI_SHIFT_REGISTER_LENGTH) {
-        PyErr_SetString(PyExc_IOError, "Failed to read/write LED Matrices via SPI (bad len).");
+    recv = PyBytes_FromStringAndSize(data.buf, data.len);
+    PyBuffer_Release(&data);
+    if (recv == NULL) {
         return NULL;
     }
-    if (rw_bytes(spi, s, s, len) < 0) {
-        PyErr_SetString(PyExc_IOError, "Failed to read/write LED Matrices via SPI (bad IO).");
+    // The new bytes object is not yet visible to any other code, so it is
+    // safe to receive into it in place.
+    s = PyBytes_AS_STRING(recv);
+    err = send_bytes(s, s, PyBytes_GET_SIZE(recv));
+    if (err < 0) {
+        Py_DECREF(recv);
+        return NULL;
+    }
+    return recv;
+}
+
+static PyObject *py_write(PyObject *self, PyObject *args){
+    Py_buffer data;
+    int err;
+
+    if(!PyArg_ParseTuple(args, "y*", &data)){
         return NULL;
     }
-    return Py_BuildValue("y#", s, len);
+    err = send_bytes(data.buf, NULL, data.len);
+    PyBuffer_Release(&data);
+    if (err < 0) {
+        return NULL;
+    }
+    return Py_BuildValue("");
+}
+
+static PyObject *py_transfer(PyObject *self, PyObject *args){
+    Py_buffer data;
+    int err;
+
+    if(!PyArg_ParseTuple(args, "w*", &data)){
+        return NULL;
+    }
+    err = send_bytes(data.buf, data.buf, data.len);
+    PyBuffer_Release(&data);
+    if (err < 0) {
+        return NULL;
+    }
+    return Py_BuildValue("");
+}
+
+static PyObject *py_pack(PyObject *self, PyObject *args){
+    Py_buffer fb, table, out;
+    Py_ssize_t table_len;
+    int err;
+
+    if(!PyArg_ParseTuple(args, "y*y*w*", &fb, &table, &out)){
+        return NULL;
+    }
+    table_len = table.len / sizeof(unsigned int);
+    if (table.len % sizeof(unsigned int) || table_len % 2) {
+        PyErr_SetString(PyExc_ValueError, "Layout table must have an even number of indices.");
+        goto fail;
+    }
+    if (out.len < table_len / 2) {
+        PyErr_SetString(PyExc_ValueError, "Bitstream buffer too small for layout table.");
+        goto fail;
+    }
+    err = pack_bytes(fb.buf, fb.len, table.buf, table_len, out.buf);
+    if (err < 0) {
+        PyErr_SetString(PyExc_IndexError, "Layout table index outside of framebuffer.");
+        goto fail;
+    }
+    PyBuffer_Release(&fb);
+    PyBuffer_Release(&table);
+    PyBuffer_Release(&out);
+    return Py_BuildValue("");
+
+fail:
+    PyBuffer_Release(&fb);
+    PyBuffer_Release(&table);
+    PyBuffer_Release(&out);
+    return NULL;
 }
 
 static PyMethodDef led_driver_methods[] = {
     {"init_spi", py_init_spi, METH_VARARGS, "Initialize the SPI port."},
-    {"send", py_send, METH_VARARGS, "Sends bytes via SPI port."},
+    {"send", py_send, METH_VARARGS, "Sends bytes via SPI port, returns bytes received."},
+    {"write", py_write, METH_VARARGS, "Sends a buffer via SPI port, discards bytes received."},
+    {"transfer", py_transfer, METH_VARARGS, "Sends a buffer via SPI port, receives bytes into it in place."},
+    {"pack", py_pack, METH_VARARGS, "Packs a framebuffer into a bitstream via a layout table."},
     {NULL, NULL, 0, NULL}  /* Sentinal */
 };
 
@@ -24,7 +24,7 @@ import time
 from subprocess import call, Popen, PIPE
 from functools import partial
 import uinput
-from threading import Timer
+from threading import Timer, Lock
 from .vec3 import Vec3
 from . import block
 from math import atan2, degrees, sqrt, floor
@@ -62,8 +62,23 @@ keys = [
     uinput.REL_X,
     uinput.REL_Y,
     ]
-device = uinput.Device(keys)
-time.sleep(0.5)
+device = None
+_init_lock = Lock()
+
+def init():
+    '''Create the simulated keyboard and mouse used to control Minecraft.
+
+    This is done automatically the first time a key is pressed or the mouse
+    is moved, so it is only needed to do the initialization at a known time.
+    Only the first call has any effect.
+    '''
+    global device
+    with _init_lock:
+        if device is None:
+            device = uinput.Device(keys)
+            # Give the system time to detect the new device
+            time.sleep(0.5)
+    return device
 
 item_keys = [eval('uinput.KEY_{:d}'.format(item+1)) for item in range(8)]
 
@@ -140,17 +155,17 @@ def key_press(key, duration=None, release=False, wait=True):
      will be released after `duration` seconds via a timer.
     '''
     if release:
-        device.emit(key, 0)
+        init().emit(key, 0)
     else:
         if not duration:
-            device.emit(key, 1)
+            init().emit(key, 1)
         else:
             if wait:
-                device.emit(key, 1)
+                init().emit(key, 1)
                 time.sleep(duration)
-                device.emit(key, 0)
+                init().emit(key, 0)
             else:
-                device.emit(key, 1)
+                init().emit(key, 1)
                 Timer(duration, key_release, args=[key]).start()
 
 def backward(duration=None, release=False, wait=True):
@@ -246,8 +261,8 @@ def look(left=0, right=0, up=0, down=0):
     Looks left/right/up/down the integer amount given.  The integer represents
     the amount of incremental mouse movement.
     '''
-    device.emit(uinput.REL_X, int(right-left), syn=False)
-    device.emit(uinput.REL_Y, int(down-up))
+    init().emit(uinput.REL_X, int(right-left), syn=False)
+    init().emit(uinput.REL_Y, int(down-up))
 
 def _wait_until_stopped(mc):
     prev = None
@@ -396,6 +411,7 @@ def get_direction(mc):
     return (theta, phi)
 
 __all__ = [
+    'init',
     'show',
     'hide',
     'key_release',
@@ -81,10 +81,32 @@ def sound_dir():
     return SOUND_DIR
 
 def master_volume(level):
+    global _master_volume_set
     if level < 0 or level > 100:
         raise ValueError("level must be between 0 and 100.")
 
     shell_cmd('amixer sset PCM {}%'.format(int(level)))
+    _master_volume_set = True
+
+_initialized = False
+_master_volume_set = False
+_init_lock = RLock()
+
+def init():
+    '''Initialize the sound system, and start the sound server.
+
+    This is done automatically when the first sound is created, so it is only
+    needed to do the initialization (which can take a few seconds) at a known
+    time.  Only the first call has any effect.
+    '''
+    global _initialized
+    with _init_lock:
+        if not _initialized:
+            # Default master volume
+            if not _master_volume_set:
+                master_volume(100)
+            start_server()
+            _initialized = True
 
 def clean_close(sock):
     try:
@@ -97,11 +119,8 @@ def clean_close(sock):
         pass
 
 class BaseSound(object):
-    # Default master volume
-    master_volume(100)
-    start_server()
-
     def __init__(self):
+        init()
         self._SAMPLE_RATE = 44100
         self._BYTES_PER_SAMPLE = 2
         self._CHANNELS = 1
@@ -490,4 +509,4 @@ class Speech(Sound):
     def __del__(self):
         os.remove(self.wav_name)
         
-__all__ = ['Sound', 'Note', 'Speech', 'master_volume' 'sound_dir']
+__all__ = ['Sound', 'Note', 'Speech', 'master_volume', 'sound_dir', 'init']
@@ -53,6 +53,24 @@ def accel_time_forces(a):
     print("Output test running at: {:.2f}Hz (MINIMUM_RATE: {}Hz)".format(rate, MINIMUM_RATE))
     return rate > MINIMUM_RATE
 
+@testing.automatic
+@io_setup()
+def accel_sampling(a):
+    a.start_sampling(100, accel.MODE_HIGH_RESOLUTION)
+    start = time.monotonic()
+    time.sleep(0.5)
+    samples = a.read_since(start)
+    TRIES = 1000
+    forces_start = time.time()
+    for n in range(TRIES):
+        x, y, z = a.forces()
+    rate = float(TRIES)/(time.time()-forces_start)
+    a.stop_sampling()
+    print("Samples in 0.5s: {} (expected ~50)".format(len(samples)))
+    print("forces() running at: {:.2f}Hz".format(rate))
+    ordered = all(s1.time < s2.time for s1, s2 in zip(samples, samples[1:]))
+    return 40 <= len(samples) <= 60 and ordered and abs(1.0 - z) < 0.05 and rate > 10000
+
 @testing.manual
 @io_setup()
 def accel_vertical(a):
@@ -1,7 +1,8 @@
 '''
 Automatic tests of gpio module via loopback output to input
 
-Short GPIO 23 to 24.
+Short GPIO 23 to 24 (or set RSTEM_GPIO_BACKEND=simulated to run without a
+Raspberry Pi).
 '''
 import testing_log
 import importlib
@@ -10,11 +11,18 @@ import time
 from threading import Timer
 from functools import wraps
 
-from rstem.gpio import Output, Input, PULL_UP, PULL_DOWN, PULL_DISABLE
-from rstem.button import Button
+from rstem.gpio import Output, Input, PinGroup, Sequence, PULL_UP, PULL_DOWN, PULL_DISABLE
+from rstem.gpio import EDGE_RISING, GpiomemBackend, SimulatedBackend, init
+from rstem.button import Button, next_event, callback_stats, configure_callbacks
+from rstem.button import OVERFLOW_BLOCK, OVERFLOW_DROP
 
 OUTPUT_PIN = 23
 INPUT_PIN = 24
+UNCONNECTED_PIN = 25
+
+backend = init()
+if isinstance(backend, SimulatedBackend):
+    backend.connect(OUTPUT_PIN, INPUT_PIN)
 
 MINIMUM_BUTTON_PRESS_PERIOD = 0.050
 MINIMUM_INPUT_PERIOD = 0
@@ -197,6 +205,63 @@ def button_6_half_releases(b, o):
     try_n_half_presses(6, b, o)
     return b.presses(press=False) == 3
 
+@testing.automatic
+@bo_setup()
+def button_next_event(b, o):
+    o.on()
+    time.sleep(MINIMUM_BUTTON_PRESS_PERIOD)
+    while next_event(timeout=0):
+        pass
+    Timer(0.1, o.off).start()
+    event = next_event(timeout=1)
+    print("Event:", event)
+    return event != None and event.button is b and event.pressed
+
+@testing.automatic
+@bo_setup()
+def button_callbacks(b, o):
+    o.on()
+    time.sleep(MINIMUM_BUTTON_PRESS_PERIOD)
+    events = []
+    b.on_release(events.append)
+    b.on_change(lambda event: events.append(event.pressed))
+    calls = callback_stats().calls
+    for level in [o.off, o.on]:
+        level()
+        time.sleep(MINIMUM_BUTTON_PRESS_PERIOD)
+    b.remove_callback(events.append)
+    o.off()
+    time.sleep(MINIMUM_BUTTON_PRESS_PERIOD)
+    print("Events:", events, callback_stats())
+    # A button's callbacks run one at a time, in order
+    return (len(events) == 4 and events[0] == True and events[1].pressed == False
+        and events[2:] == [False, True] and callback_stats().calls - calls == 4)
+
+@testing.automatic
+@bo_setup()
+def button_callbacks_block(b, o):
+    # With a full queue, the input service waits for room - while callbacks
+    # that create and disable Buttons still run.
+    configure_callbacks(queue_length=1, overflow=OVERFLOW_BLOCK)
+    o.on()
+    time.sleep(MINIMUM_BUTTON_PRESS_PERIOD)
+    events = []
+    def callback(event):
+        time.sleep(4*MINIMUM_BUTTON_PRESS_PERIOD)
+        Button(UNCONNECTED_PIN).disable()
+        events.append(event.pressed)
+    b.on_change(callback)
+    for level in [o.off, o.on, o.off, o.on]:
+        level()
+        time.sleep(MINIMUM_BUTTON_PRESS_PERIOD)
+    for i in range(100):
+        if len(events) == 4:
+            break
+        time.sleep(MINIMUM_BUTTON_PRESS_PERIOD)
+    configure_callbacks(queue_length=64, overflow=OVERFLOW_DROP)
+    print("Events:", events, callback_stats())
+    return events == [True, False, True, False]
+
 def _test_output_defaults_with_button():
     b = Button(INPUT_PIN)
     o = Output(OUTPUT_PIN) # default is active low!
@@ -428,6 +493,48 @@ def time_output(i, o):
     print("Output test running at: {:.2f}Hz (MINIMUM_RATE: {}Hz)".format(rate, MINIMUM_RATE))
     return rate > MINIMUM_RATE
 
+@testing.automatic
+@io_setup()
+def time_output_gpiomem(i, o):
+    # With the GPIO registers memory mapped, toggling an output is just a
+    # memory store.
+    if not isinstance(o._backend, GpiomemBackend):
+        print("GPIO registers are not memory mapped")
+        return False
+    TRIES = 10000
+    start = time.time()
+    for n in range(TRIES):
+        o.on()
+        o.off()
+    end = time.time()
+    rate = float(TRIES)/(end-start)
+    MINIMUM_RATE = 50000
+    print("Output test running at: {:.2f}Hz (MINIMUM_RATE: {}Hz)".format(rate, MINIMUM_RATE))
+    return rate > MINIMUM_RATE
+
+@testing.automatic
+@io_setup()
+def pin_group(i, o):
+    outputs = PinGroup([o])
+    inputs = PinGroup([i])
+    outputs.write([True])
+    on = inputs.read() == (True,) and inputs.read_mask() == 1
+    outputs.write(0)
+    off = inputs.read() == (False,) and inputs.read_mask() == 0
+    return on and off
+
+@testing.automatic
+@io_setup()
+def input_wait_edge(i, o):
+    o.off()
+    i.detect_edges(EDGE_RISING)
+    timed_out = i.wait_edge(timeout=0.1) == None
+    Timer(0.1, o.on).start()
+    start = time.monotonic()
+    edge = i.wait_edge(timeout=1)
+    print("Edge:", edge, "after {:.4f}s".format(time.monotonic() - start))
+    return timed_out and edge != None and edge.level == 1
+
 def input_pull_test(pull, stayed_on, stayed_off, configure=False):
     for n in range(5):
         if configure:
@@ -495,3 +602,60 @@ def verify_cpu(i, o):
     rev = Output.board_rev()
     max_cpu = 20 if rev < 0x1000 else 10;
     return testing.verify_cpu(max_cpu)
+
+@testing.automatic
+@io_setup()
+def output_pwm(i, o):
+    o.pwm(50, 0.25)
+    time.sleep(0.1)
+    samples = []
+    end = time.monotonic() + 1
+    while time.monotonic() < end:
+        samples.append(i.is_on())
+        time.sleep(0.0005)
+    o.off()
+    time.sleep(0.05)
+    duty = samples.count(True) / len(samples)
+    print("Measured duty: {:.3f} (expected 0.25)".format(duty))
+    return abs(duty - 0.25) < 0.05 and i.is_off()
+
+@testing.automatic
+@io_setup()
+def output_sequence(i, o):
+    o.off()
+    playback = Sequence([(o, True, 0.05), (o, False, 0.1)]).play()
+    time.sleep(0.075)
+    on = i.is_on()
+    finished = playback.wait(timeout=1)
+    print("Timing error: mean {:.6f}s, max {:.6f}s".format(playback.mean_error(), playback.max_error()))
+    return on and finished and i.is_off() and playback.max_error() < 0.005
+
+@testing.automatic
+@io_setup()
+def output_sequence_background(i, o):
+    # A dense sequence must leave time for the rest of the program
+    def progress(duration=0.5):
+        count = 0
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            count += 1
+        return count
+    alone = progress()
+    playback = Sequence.pattern(o, '10', 0.0005).play()
+    playing = progress()
+    playback.cancel()
+    print("Main thread progress: {} alone, {} while playing".format(alone, playing))
+    return playing > 0.75 * alone
+
+@testing.automatic
+@io_setup()
+def input_capture(i, o):
+    o.off()
+    capture = i.capture(1000, duration=0.5)
+    playback = Sequence.pattern(o, '1100', 0.02, repeat=5).play()
+    finished = capture.wait(timeout=2)
+    times, levels = capture.snapshot()
+    edges = list(capture.iter_edges())
+    print("Samples:", len(levels), "missed:", capture.missed, "edges:", len(edges))
+    playback.cancel()
+    return finished and len(levels) == 500 and len(edges) == 10
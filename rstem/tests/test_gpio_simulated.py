@@ -0,0 +1,81 @@
+'''
+Automatic tests of the simulated GPIO backend
+
+No hardware is needed: all pins are simulated by a SimulatedBackend.
+'''
+import testing_log
+import importlib
+import testing
+import time
+
+from rstem.gpio import Output, Input, SimulatedBackend, Transition, init
+from rstem.gpio import EDGE_BOTH, PULL_DOWN
+
+OUTPUT_PIN = 23
+INPUT_PIN = 24
+
+backend = init(backend=SimulatedBackend())
+
+@testing.automatic
+def simulated_drive():
+    i = Input(INPUT_PIN, pull=PULL_DOWN)
+    pulled_down = not i.is_on()
+    backend.drive(INPUT_PIN, 1)
+    driven_high = i.is_on()
+    backend.drive(INPUT_PIN, None)
+    released = not i.is_on()
+    i.disable()
+    return pulled_down and driven_high and released
+
+@testing.automatic
+def simulated_schedule_edges():
+    i = Input(INPUT_PIN)
+    backend.drive(INPUT_PIN, 0)
+    i.detect_edges(EDGE_BOTH)
+    start = time.monotonic()
+    changes = [(0.05, 1), (0.1, 0), (0.15, 1)]
+    backend.schedule(INPUT_PIN, changes, start)
+    edges = [i.wait_edge(timeout=1) for change in changes]
+    done = backend.wait_schedule(timeout=1)
+    on = i.is_on()
+    backend.drive(INPUT_PIN, None)
+    i.disable()
+    if None in edges:
+        return False
+    offsets = [edge.time - start for edge in edges]
+    print("Edges:", [edge.level for edge in edges], "at", ["{:.4f}".format(o) for o in offsets])
+    return (done and on and [edge.level for edge in edges] == [1, 0, 1]
+        and all(abs(offset - change[0]) < 0.02 for offset, change in zip(offsets, changes)))
+
+@testing.automatic
+def simulated_transitions():
+    o = Output(OUTPUT_PIN, active_low=False)
+    backend.transitions.clear()
+    for n in range(3):
+        o.on()
+        time.sleep(0.001)
+        o.off()
+        time.sleep(0.001)
+    transitions = list(backend.transitions)
+    o.disable()
+    print("Transitions:", transitions)
+    increasing = all(a.time < b.time for a, b in zip(transitions, transitions[1:]))
+    return (all(isinstance(t, Transition) and t.pin == OUTPUT_PIN for t in transitions)
+        and [t.level for t in transitions] == [1, 0] * 3 and increasing)
+
+@testing.automatic
+def simulated_pwm_duty():
+    o = Output(OUTPUT_PIN, active_low=False)
+    o.pwm(50, 0.3, hardware=False)
+    time.sleep(0.1)
+    backend.transitions.clear()
+    time.sleep(1)
+    transitions = list(backend.transitions)
+    o.disable()
+    # Measure whole periods, from the first rising edge to the last
+    rising = [n for n, t in enumerate(transitions) if t.level == 1]
+    periods = transitions[rising[0]:rising[-1] + 1]
+    high = sum(b.time - a.time for a, b in zip(periods, periods[1:]) if a.level == 1)
+    duty = high / (periods[-1].time - periods[0].time)
+    print("Measured duty: {:.3f} (expected 0.3), periods: {}".format(duty, len(rising) - 1))
+    return abs(duty - 0.3) < 0.03 and abs(len(rising) - 50) <= 2
@@ -18,7 +18,7 @@ single matrix rotated clockwise 90 degrees.
 import testing
 import time
 from functools import partial
-from rstem.led_matrix import FrameBuffer, Sprite, Text
+from rstem.led_matrix import FrameBuffer, Sprite, Text, ScrollingText, SimulatedChain
 import copy
 
 def makefb(lines):
@@ -138,6 +138,12 @@ def erase3():
     fb.erase(7)
     return fb._framebuffer() == makefb('77777777\n' * 8)
 
+@testing.automatic
+def buffer_column_order():
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.point(1,2,color=5)
+    return fb.buffer[1*fb.height + 2] == 5 and fb.column(1)[2] == 5
+
 #########################################################################
 # point() tests
 #
@@ -343,6 +349,28 @@ def line5():
     return arrays_equal(expected_fb, fb)
 
 
+@testing.automatic
+def out_of_range_colors():
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.erase(-1)
+    fb.point(0, 0, color=300)
+    fb.point(1, 0, color=-1)
+    fb.rect((0,1), (2,1), fill=True, color=16)
+    fb.line((0,7), (7,7), color=0x20)
+    expected_fb = '''
+        FFFFFFFF
+        00000000
+        00000000
+        00000000
+        00000000
+        00000000
+        FF000000
+        F0000000
+        '''
+    drawn = arrays_equal(expected_fb, fb)
+    fb.erase(99)
+    return drawn and str(fb) == ('F' * 8 + '\n') * 8
+
 #########################################################################
 # rect() tests
 #
@@ -414,6 +442,144 @@ def rect4():
         '''
     return arrays_equal(expected_fb, fb)
 
+@testing.automatic
+def circle1():
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.circle((3,3), 3)
+    expected_fb = '''
+        00000000
+        00FFF000
+        0F000F00
+        F00000F0
+        F00000F0
+        F00000F0
+        0F000F00
+        00FFF000
+        '''
+    return arrays_equal(expected_fb, fb)
+
+def polygon_reference(points):
+    # Fills the polygon pixel by pixel: a pixel is filled if it is on the
+    # outline, or inside (or on) the polygon along its column by the even-odd
+    # rule.
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.polygon(points)
+    edges = list(zip(points, points[1:] + points[:1]))
+    for x in range(fb.width):
+        crossings = [y0 + (x - x0)*(y1 - y0)/(x1 - x0)
+            for (x0, y0), (x1, y1) in edges if x0 <= x < x1 or x1 <= x < x0]
+        for y in range(fb.height):
+            below = len([c for c in crossings if c < y])
+            at_or_below = len([c for c in crossings if c <= y])
+            if below % 2 or at_or_below % 2:
+                fb.point(x, y)
+    return fb
+
+@testing.automatic
+def polygon_fill_concave():
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.polygon([(0,0),(7,0),(7,7),(5,7),(5,2),(2,2),(2,7),(0,7)], fill=True)
+    expected_fb = '''
+        FFF00FFF
+        FFF00FFF
+        FFF00FFF
+        FFF00FFF
+        FFF00FFF
+        FFFFFFFF
+        FFFFFFFF
+        FFFFFFFF
+        '''
+    return arrays_equal(expected_fb, fb)
+
+@testing.automatic
+def polygon_fill_self_touching():
+    # Two squares that touch at a corner
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.polygon([(0,0),(3,0),(3,3),(6,3),(6,6),(3,6),(3,3),(0,3)], fill=True)
+    expected_fb = '''
+        00000000
+        000FFFF0
+        000FFFF0
+        000FFFF0
+        FFFFFFF0
+        FFFF0000
+        FFFF0000
+        FFFF0000
+        '''
+    return arrays_equal(expected_fb, fb)
+
+@testing.automatic
+def polygon_fill_reference():
+    polygons = [
+        # Concave arrowhead
+        [(0,0),(7,1),(3,3),(7,7),(1,5)],
+        # Self-touching at (4,4), and partly off the framebuffer
+        [(0,0),(4,4),(9,1),(6,7),(4,4),(-2,6)],
+        # Concave, with edges at shallow and steep slopes
+        [(1,0),(6,2),(7,7),(5,3),(2,6),(0,1)],
+        ]
+    passed = True
+    for points in polygons:
+        fb = FrameBuffer(matrix_layout=[(0,0,0)])
+        fb.polygon(points, fill=True)
+        passed = arrays_equal(polygon_reference(points), fb) and passed
+    return passed
+
+@testing.automatic
+def flood_fill1():
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.rect((1,1),(6,5))
+    fb.flood_fill((3,3), color=7)
+    expected_fb = '''
+        00000000
+        00000000
+        0FFFFFF0
+        0F7777F0
+        0F7777F0
+        0F7777F0
+        0FFFFFF0
+        00000000
+        '''
+    return arrays_equal(expected_fb, fb)
+
+@testing.automatic
+def scroll1():
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.rect((0,0),(3,2), fill=True)
+    fb.scroll(-1, 2, wrap=True)
+    fb.scroll(2, 0, fill=1, origin=(0,0), dimensions=(4,8))
+    expected_fb = '''
+        11000000
+        11000000
+        11000000
+        11000000
+        11FF000F
+        11FF000F
+        11000000
+        11000000
+        '''
+    return arrays_equal(expected_fb, fb)
+
+@testing.automatic
+def blit_array1():
+    import numpy
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    image = numpy.zeros((16,16), dtype=numpy.uint8)
+    image[0:2,:] = 255
+    image[:,0:2] = 128
+    fb.blit_array(image, scale=2)
+    expected_fb = '''
+        8FFFFFFF
+        80000000
+        80000000
+        80000000
+        80000000
+        80000000
+        80000000
+        80000000
+        '''
+    return arrays_equal(expected_fb, fb)
+
 #########################################################################
 # misc tests
 #
@@ -427,10 +593,110 @@ def detect_fail():
         return True
     return False
 
+@testing.automatic
+def simulated_chain_detect():
+    return FrameBuffer.detect(SimulatedChain(5)) == 5
+
+@testing.automatic
+def simulated_chain_show():
+    # Two matrices, the second rotated 180 degrees
+    chain = SimulatedChain(2)
+    fb = FrameBuffer(matrix_layout=[(0,0,0),(8,0,180)], transport=chain)
+    fb.rect((0,0),(16,8))
+    fb.point(15,0, color=1)
+    fb.show()
+    expected_chain = '''
+        FFFFFFFF
+        F0000000
+        F0000000
+        F0000000
+        F0000000
+        F0000000
+        F0000000
+        FFFFFFFF
+
+        1FFFFFFF
+        F0000000
+        F0000000
+        F0000000
+        F0000000
+        F0000000
+        F0000000
+        FFFFFFFF
+        '''
+    return arrays_equal(expected_chain, chain)
+
 @testing.automatic
 def time_show():
     fb = FrameBuffer(matrix_layout=[(0,0,0)])
-    return timeit(partial(fb.show), loops=200) > 300
+    return timeit(partial(fb.show, force=True), loops=200) > 300
+
+@testing.automatic
+def time_show_unchanged():
+    fb = FrameBuffer(matrix_layout=[(0,0,0)])
+    fb.show()
+    return timeit(partial(fb.show), loops=200) > 3000
+
+@testing.automatic
+def time_async_show():
+    with FrameBuffer(matrix_layout=[(0,0,0)], async_show=True) as fb:
+        freq = timeit(partial(fb.show, force=True), loops=200)
+        presented = fb.wait_presented(timeout=1)
+    return presented and freq > 3000 and not fb._presenter_thread.is_alive()
+
+@testing.automatic
+def async_show_close():
+    chain = SimulatedChain(1)
+    fb = FrameBuffer(matrix_layout=[(0,0,0)], async_show=True, transport=chain)
+    fb.point(0, 0)
+    fb.show()
+    # The last shown frame is sent before the background thread stops
+    fb.close()
+    stopped = not fb._presenter_thread.is_alive()
+    fb.point(1, 1)
+    fb.show()
+    expected_chain = '''
+        00000000
+        00000000
+        00000000
+        00000000
+        00000000
+        00000000
+        0F000000
+        F0000000
+        '''
+    return stopped and arrays_equal(expected_chain, chain)
+
+@testing.automatic
+def run_frames():
+    chain = SimulatedChain(1)
+    fb = FrameBuffer(matrix_layout=[(0,0,0)], transport=chain)
+    frames = []
+    def update():
+        if len(frames) == 10:
+            return False
+        frames.append(time.monotonic())
+        fb.erase()
+        fb.point(len(frames) % 8, 0)
+    start = time.monotonic()
+    stats = fb.run(update, fps=50)
+    elapsed = time.monotonic() - start
+    print("Elapsed: {:.3f} secs, skipped: {}, headroom: {:.2f}".format(
+        elapsed, stats.frames_skipped, stats.headroom()))
+    # 10 frames at 50 fps take 0.2 seconds, and the last frame is shown
+    expected_chain = '''
+        00000000
+        00000000
+        00000000
+        00000000
+        00000000
+        00000000
+        00000000
+        00F00000
+        '''
+    return (stats is fb.frame_stats and stats.frames == 10 and len(stats.timings) == 10
+        and stats.frames_skipped == 0 and 0 < stats.headroom() <= 1
+        and 0.18 < elapsed < 0.3 and arrays_equal(expected_chain, chain))
 
 #########################################################################
 # Sprite tests
@@ -576,6 +842,22 @@ def sprite_rotate_bad_angle():
         return True
     return False
 
+@testing.automatic
+def sprite_rotate_cached():
+    one = Sprite(default_sprite)
+    two = Sprite(default_sprite)
+    one.rotate(180)
+    two.flip().flip(vertical=True)
+    # Same transforms of the same image share one cached bitmap, but each
+    # sprite gets its own copy of it
+    return one._transformed is two._transformed \
+            and one.bitmap == two.bitmap and one.bitmap is not two.bitmap
+
+@testing.automatic
+def sprite_time_rotate():
+    s = copy.deepcopy(default_sprite)
+    return timeit(partial(s.rotate, 90), loops=1000) > 20000
+
 @testing.automatic
 def sprite_time_bitmap():
     s = copy.deepcopy(default_sprite)
@@ -600,6 +882,28 @@ def sprite_draw_default_origin():
         '''
     return arrays_equal(expected_fb, fb)
 
+@testing.automatic
+def sprite_draw_after_change():
+    chain = SimulatedChain(1)
+    fb = FrameBuffer(matrix_layout=[(0,0,0)], transport=chain)
+    s = copy.deepcopy(default_sprite)
+    fb.draw(s)
+    # Pixels changed in place are drawn the next time
+    s.bitmap[0][0] = 0xE
+    fb.erase()
+    fb.draw(s)
+    expected_fb = '''
+        00000000
+        00000000
+        00000000
+        00000000
+        12300000
+        45600000
+        78900000
+        EBC00000
+        '''
+    return arrays_equal(expected_fb, fb)
+
 @testing.automatic
 def sprite_draw():
     fb = FrameBuffer(matrix_layout=[(0,0,0)])
@@ -768,6 +1072,25 @@ def sprite_reinit_change():
     return arrays_equal(expected_original, original) \
             and arrays_equal(expected_modified, modified)
 
+@testing.automatic
+def sprite_transform_change():
+    # Transformed sprites of the same image must not share pixels
+    modified = copy.deepcopy(default_sprite).rotate(90)
+    modified.bitmap[0][0] = 0
+    unmodified = copy.deepcopy(default_sprite).rotate(90)
+    expected_modified = '''
+        369c
+        258b
+        047a
+        '''
+    expected_unmodified = '''
+        369c
+        258b
+        147a
+        '''
+    return arrays_equal(expected_modified, modified) \
+            and arrays_equal(expected_unmodified, unmodified)
+
 #########################################################################
 # Text tests
 #
@@ -814,6 +1137,49 @@ def small_2spaces_text():
 def time_text():
     return timeit(partial(Text, '0123456789'), loops=10) > 5
 
+@testing.automatic
+def long_text():
+    t = Text('0123456789' * 200, font_name='3x5')
+    return t.width == 2000*3 + 1999
+
+@testing.automatic
+def scrolling_text():
+    # Window starts left of the text, so scroll in by the window width
+    st = ScrollingText('ABCabc', width=8, font_name='3x5').scroll(8 + 4)
+    expected_bitmap = Text('ABCabc', font_name='3x5').crop((4,0),(8,5))
+    return arrays_equal(expected_bitmap, st)
+
+@testing.automatic
+def scrolling_text_right():
+    # 'A' (4 columns wide, with spacing) has scrolled out, so the text can be
+    # scrolled back to 'B', but no further.
+    st = ScrollingText('ABCabc', width=8, font_name='3x5').scroll(8 + 6).scroll(-2)
+    expected_bitmap = Text('ABCabc', font_name='3x5').crop((4,0),(8,5))
+    try:
+        st.scroll(-1)
+    except ValueError:
+        raised = True
+    else:
+        raised = False
+    return arrays_equal(expected_bitmap, st) and raised
+
+@testing.automatic
+def scrolling_text_append():
+    st = ScrollingText('AB', width=8, font_name='3x5').scroll(8 + 4)
+    st.append('Cabc')
+    expected_bitmap = Text('ABCabc', font_name='3x5').crop((4,0),(8,5))
+    return arrays_equal(expected_bitmap, st) and not st.done() \
+            and st.scroll(6*4).done()
+
+@testing.automatic
+def scrolling_text_repeat():
+    # Scrolling one whole message (3 chars of 4 columns) later shows the same
+    st = ScrollingText('ABC', width=8, font_name='3x5', repeat=True).scroll(8 + 2)
+    expected_bitmap = Text('ABCAB', font_name='3x5').crop((2,0),(8,5))
+    first = arrays_equal(expected_bitmap, st)
+    st.scroll(3*4*5)
+    return first and arrays_equal(expected_bitmap, st) and not st.done()
+
 #########################################################################
 # Manual tests
 #
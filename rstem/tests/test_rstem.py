@@ -0,0 +1,55 @@
+'''
+Automatic tests of the rstem package: importing subsystems on first use, and
+profiling their imports.
+'''
+import testing_log
+import importlib
+import testing
+import re
+import sys
+import subprocess
+from io import StringIO
+
+import rstem
+from rstem import import_profile
+
+PROFILED_SUBSYSTEMS = ['gpio', 'button']
+
+@testing.automatic
+def import_is_lazy():
+    code = 'import sys, rstem; print(sorted(m for m in sys.modules if m.startswith("rstem.")))'
+    proc = subprocess.run([sys.executable, '-c', code],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    print("Imported:", proc.stdout.strip())
+    return proc.returncode == 0 and proc.stdout.strip() == '[]'
+
+@testing.automatic
+def import_on_first_use():
+    gpio = importlib.import_module('rstem.gpio')
+    try:
+        rstem.no_such_subsystem
+    except AttributeError:
+        missing = True
+    else:
+        missing = False
+    return rstem.gpio is gpio and 'led_matrix' in dir(rstem) and missing
+
+def _report(init):
+    out = StringIO()
+    import_profile.report(PROFILED_SUBSYSTEMS, init=init, file=out)
+    print(out.getvalue())
+    return out.getvalue()
+
+@testing.automatic
+def import_profile_report():
+    report = _report(init=False)
+    return all(re.search(r'^rstem\.{} +import +[\d.]+ ms$'.format(name), report, re.MULTILINE)
+        for name in PROFILED_SUBSYSTEMS)
+
+@testing.automatic
+def import_profile_report_init():
+    # Only gpio has an init() here, so only it reports an init time.
+    report = _report(init=True)
+    gpio = re.search(r'^rstem\.gpio +import +[\d.]+ ms +init +[\d.]+ ms$', report, re.MULTILINE)
+    button = re.search(r'^rstem\.button +import +[\d.]+ ms$', report, re.MULTILINE)
+    return gpio != None and button != None
@@ -65,9 +65,11 @@ setup(
         'Topic :: Scientific/Engineering',
         'Topic :: Software Development :: Embedded Systems',
         'License :: OSI Approved :: Apache Software License',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
     ],
+    python_requires = '>=3.7',
     cmdclass = {'install': install},  # overload install command
     ext_modules = [led_driver, soundutil],  # c extensions defined above
     install_requires = ['beautifulsoup4', 'python-uinput', 'pdoc']